@@ -1,8 +1,7 @@
 import ast
+import threading
 import tkinter as tk
 from tkinter import ttk
-import matplotlib.pyplot as plt
-from matplotlib.lines import lineStyles
 
 from logger import Logger
 import poker
@@ -34,6 +33,7 @@ class UserInterface(tk.Tk):
         self.game_messages = tk.Text(self, font=("Courier", 20))
         self.game_messages.config(height=30)
         self.game_messages.pack(fill=tk.BOTH, expand=True)
+        self._rendered_message = None  # type: str | None # the string currently shown in game_messages
 
         self.notebook = ttk.Notebook(self)
         self.notebook.pack(fill=tk.BOTH, expand=True)
@@ -115,6 +115,10 @@ class UserInterface(tk.Tk):
         self.roulette_min_bank_value = ttk.Label(self.roulette_right_frame, text="0")
         self.roulette_min_bank_value.pack(pady=10)
 
+        # one figure is embedded in the right frame and reused for every simulation run, the lines are updated in place.
+        # it is built by the first simulation run so matplotlib is only imported when roulette is actually played
+        self._roulette_fig = None
+
         # ---------- Poker Stuff -----------------------
 
         # add button to start a new poker game
@@ -139,68 +143,150 @@ class UserInterface(tk.Tk):
         self.poker_table_label.pack()
 
 
+    def set_game_messages(self, string: str):
+        """ Replaces the contents of the game messages text field, skips the re-render if the string is already shown """
+        if string == self._rendered_message:
+            return # ------------------------------------------------------------------------------------------------------>
+        self._rendered_message = string
+        self.game_messages.replace("1.0", tk.END, string)
+
     def _notebook_tab_changed(self, event):
         """ Handles the notebook tab change event to update the game messages """
         current_tab = self.notebook.index(self.notebook.select())
         if current_tab == 0:
             # Poker tab selected
-            self.game_messages.replace("1.0", tk.END, self.casino.poker_table.get_game_state_string())
+            self.set_game_messages(self.casino.poker_table.get_game_state_string())
             self.update_poker_tab_display()
         elif current_tab == 1:
-            self.game_messages.replace("1.0", tk.END, self.casino.roulette_table.get_game_state_string())
+            self.set_game_messages(self.casino.roulette_table.get_game_state_string())
 
     # -------------------------------------------------------------------------------------
     #                                 Roulette
     # -------------------------------------------------------------------------------------
 
 
+    def _build_roulette_plot(self):
+        """ Embeds the bank history figure in the roulette tab, the data is filled in by run_roulette_simulation.
+        The lines and legend are animated so a run that keeps the axis limits only blits them over the saved
+        background instead of redrawing the ticks and labels """
+        from matplotlib.figure import Figure # imported here to keep matplotlib out of the startup time
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        self._roulette_fig = Figure()
+        self._roulette_ax = self._roulette_fig.add_subplot()
+        self._bank_line, = self._roulette_ax.plot([], [], marker='o', linestyle='-', animated=True)
+        self._init_line, = self._roulette_ax.plot([], [], marker='', linestyle='-', color='black', label=f"Initial Bank", animated=True)
+        self._roulette_ax.set_title("Bank History")
+        self._roulette_ax.set_xlabel("Spin Number")
+        self._roulette_ax.set_ylabel("Bank Amount")
+
+        self._roulette_canvas = FigureCanvasTkAgg(self._roulette_fig, master=self.roulette_right_frame)
+        self._roulette_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self._roulette_canvas.mpl_connect('draw_event', self._on_roulette_draw) # a resize also redraws, keep the background in sync
+        self._roulette_limits = None
+        self._roulette_bg = None
+        self._roulette_canvas.draw()
+
+    def _on_roulette_draw(self, event):
+        """ Snapshots the static background after a full draw, then paints the animated artists on top """
+        self._roulette_bg = self._roulette_canvas.copy_from_bbox(self._roulette_ax.bbox)
+        self._draw_roulette_artists()
+
+    def _draw_roulette_artists(self):
+        """ Draws the animated artists of the bank history plot """
+        for artist in (self._bank_line, self._init_line, self._roulette_ax.get_legend()):
+            if artist is not None:
+                self._roulette_ax.draw_artist(artist)
+
     def run_roulette_simulation(self):
-        """ Runs a simulation of the roulette game based on user input """
-        try:
+        """ Runs a simulation of the roulette game based on user input, the spins run on a worker thread so the ui
+        stays responsive and the results are handed back to the tk thread with after() """
+        parsed_inputs = self._parse_roulette_inputs()
+        if parsed_inputs is None:
+            return # -------------------------------------------------------------------------------------------------->
+        self.roulette_run_simulation_button.config(state=tk.DISABLED)
+        threading.Thread(target=self._execute_roulette_simulation, args=(parsed_inputs,), daemon=True).start()
 
+    def _parse_roulette_inputs(self) -> tuple | None:
+        """ Reads and validates the roulette settings, runs on the tk thread
+        :return: (roulette_table, player, bets, number_of_spins, bank_amount) or None if the input is invalid, the
+        error is shown in the game messages """
+        try:
             # create a new table based on user settings
             use_euro = self.roulette_european_var.get()
-            roulette_table = self.casino.roulette_table = roulette.RouletteTable(european=use_euro)
+            roulette_table = roulette.RouletteTable(european=use_euro)
             bank_amount = float(self.roulette_entry_bank_amount.get())
+            number_of_spins = int(self.roulette_entry_number_of_spins.get())
 
             # add a player to the roulette table
             p_name = 'Bob'
-            player = roulette.RoulettePlayer(p_name)
-            player.chips += bank_amount
+            player = roulette.RoulettePlayer(p_name, n_spins=number_of_spins, chips=bank_amount)
             roulette_table.add_player(player)
 
             # setup the game
-            number_of_spins = int(self.roulette_entry_number_of_spins.get())
-            for spin in range(number_of_spins):
-                bet_amount = self.roulette_entry_bet_amount.get()
-                bet_positions = self.roulette_entry_bet_positions.get()
-                roulette_table.table_place_bet(bet_positions, bet_amount, player_name=p_name)
-                roulette_table.spin_the_wheel()
-
-                # display the results in the game messages text field
-                self.game_messages.replace("1.0", tk.END, roulette_table.get_game_state_string())
-
-            bank = player.running_bank
-
-            # plot the history of the bank
-            plot_label = f"{p_name}'s Bank History  --  Min: {min(bank):.2f}  --  Max: {max(bank):.2f}  --  Take Home: {bank[-1]-bank_amount:.2f}"
-            plt.plot(bank, marker='o', linestyle='-', label=f"{p_name}'s Bank History")
-            plt.plot([bank_amount]*len(bank), marker='', linestyle='-', color='black', label=f"Initial Bank")
-            plt.legend()
-            plt.title(plot_label)
-            plt.xlabel("Spin Number")
-            plt.ylabel("Bank Amount")
-            plt.show()
-
-            # update the roulette fields
-            self.roulette_final_bank_value.config(text=f"{player.running_bank[-1]:.2f}")
-            self.roulette_max_bank_value.config(text=f"{max(player.running_bank):.2f}")
-            self.roulette_min_bank_value.config(text=f"{min(player.running_bank):.2f}")
-
+            bet_amount = self.roulette_entry_bet_amount.get()
+            bet_positions = self.roulette_entry_bet_positions.get()
+            bets = roulette_table.parse_bets(bet_positions, bet_amount) # parse the user input once
+            roulette_table.table_place_bet_parsed(bets, player_name=p_name) # validates the bets
 
         except Exception as ex:
-            self.game_messages.replace("1.0", tk.END, f"Error Placing Bet: {ex}")
-            return # -------------------------------------------------------------------------------------------------->
+            self.set_game_messages(f"Error Placing Bet: {ex}")
+            return None # --------------------------------------------------------------------------------------------->
+
+        return roulette_table, player, bets, number_of_spins, bank_amount
+
+    def _execute_roulette_simulation(self, parsed_inputs: tuple):
+        """ Runs all the spins at once on the worker thread, the same bets are placed on every spin. the results or the
+        error are handed back to the tk thread with after()
+        :param parsed_inputs: the validated settings from _parse_roulette_inputs """
+        roulette_table, player, bets, number_of_spins, bank_amount = parsed_inputs
+        try: # once around the whole run, there is no per spin loop here
+            player.extend_running_bank(roulette_table.run_vectorized(number_of_spins, bets, bank_amount))
+        except Exception as ex: # e.g. out of memory for the spin temporaries, hand it back so the button is re-enabled
+            self.after(0, self._roulette_simulation_failed, ex)
+        else:
+            self.after(0, self._finish_roulette_simulation, roulette_table, player, bank_amount)
+
+    def _roulette_simulation_failed(self, ex: Exception):
+        """ Shows an error from the roulette worker thread, runs on the tk thread """
+        self.roulette_run_simulation_button.config(state=tk.NORMAL)
+        self.set_game_messages(f"Error Running Simulation: {ex}")
+
+    def _finish_roulette_simulation(self, roulette_table: roulette.RouletteTable, player: roulette.RoulettePlayer, bank_amount: float):
+        """ Displays the results of a roulette simulation, runs on the tk thread """
+        self.roulette_run_simulation_button.config(state=tk.NORMAL)
+        self.casino.roulette_table = roulette_table
+        p_name = player.name
+        bank = player.running_bank
+        bank_min, bank_max = bank.min(), bank.max()
+
+        # display the results in the game messages text field
+        self.set_game_messages(roulette_table.get_game_state_string())
+
+        # plot the history of the bank
+        if self._roulette_fig is None:
+            self._build_roulette_plot()
+        plot_label = f"{p_name}'s Bank History  --  Min: {bank_min:.2f}  --  Max: {bank_max:.2f}  --  Take Home: {bank[-1]-bank_amount:.2f}"
+        ax = self._roulette_ax
+        self._bank_line.set_data(range(len(bank)), bank)
+        self._bank_line.set_label(plot_label)
+        self._init_line.set_data([0, len(bank)-1], [bank_amount, bank_amount])
+        ax.relim()
+        ax.autoscale_view()
+        ax.legend(loc='upper left').set_animated(True)
+        limits = (ax.get_xlim(), ax.get_ylim())
+        if limits != self._roulette_limits: # the ticks changed, redraw everything, the draw event saves the new background
+            self._roulette_limits = limits
+            self._roulette_canvas.draw()
+        else: # only the lines changed, blit them over the saved background
+            self._roulette_canvas.restore_region(self._roulette_bg)
+            self._draw_roulette_artists()
+            self._roulette_canvas.blit(ax.bbox)
+
+        # update the roulette fields
+        self.roulette_final_bank_value.config(text=f"{bank[-1]:.2f}")
+        self.roulette_max_bank_value.config(text=f"{bank_max:.2f}")
+        self.roulette_min_bank_value.config(text=f"{bank_min:.2f}")
 
 
 
@@ -234,7 +320,7 @@ class UserInterface(tk.Tk):
         else:
             table.next_game()
         # print game state to the game messages text field
-        self.game_messages.replace("1.0", tk.END, self.casino.poker_table.get_game_state_string())
+        self.set_game_messages(self.casino.poker_table.get_game_state_string())
         self.update_poker_tab_display()
 
     def button_bet(self):
@@ -243,12 +329,12 @@ class UserInterface(tk.Tk):
         try:
             table.human_bet(int(amount))
         except Exception as ex:
-            self.game_messages.replace("1.0", tk.END, f'Invalid Bet: {ex}')
+            self.set_game_messages(f'Invalid Bet: {ex}')
         else:
             table.progress_game('button_bet')
             self.update_poker_tab_display()
             # replace game message with updated message
-            self.game_messages.replace("1.0", tk.END, table.get_game_state_string())
+            self.set_game_messages(table.get_game_state_string())
 
     def button_check(self):
         amount = 0
@@ -256,12 +342,12 @@ class UserInterface(tk.Tk):
         try:
             table.human_bet(int(amount))
         except Exception as ex:
-            self.game_messages.replace("1.0", tk.END, f'Invalid Bet: {ex}')
+            self.set_game_messages(f'Invalid Bet: {ex}')
         else:
             table.progress_game('button_bet')
             self.update_poker_tab_display()
             # replace game message with updated message
-            self.game_messages.replace("1.0", tk.END, table.get_game_state_string())
+            self.set_game_messages(table.get_game_state_string())
 
     def button_fold(self):
         for human in self.casino.poker_table.human_players: # type: poker.PokerPlayer # at this point there is only 1 human player but it's a list
@@ -269,7 +355,7 @@ class UserInterface(tk.Tk):
         self.casino.poker_table.progress_game('button_bet')
         self.update_poker_tab_display()
         # replace game message with updated message
-        self.game_messages.replace("1.0", tk.END, self.casino.poker_table.get_game_state_string())
+        self.set_game_messages(self.casino.poker_table.get_game_state_string())
 
 
 
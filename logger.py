@@ -1,20 +1,26 @@
 """ a super simple logger module """
 
-import datetime
+import time
+
+ENABLE_LOG = __debug__  # set to False to silence Logger.message, python -O turns it off
 
 class Logger:
     """ A simple logger class that logs messages to the console. """
 
     def _prefix(self):
-        """ Generate a prefix for the log message with the current time. """
-        time = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]  # Get current time in HH:MM:SS.mmm format
-        str = f'{time}::'
-        return str
+        """ Generate a prefix for the log message with the current time in HH:MM:SS.mmm format. """
+        seconds, ns = divmod(time.time_ns(), 1_000_000_000)
+        lt = time.localtime(seconds)
+        return f'{lt.tm_hour:02d}:{lt.tm_min:02d}:{lt.tm_sec:02d}.{ns // 1_000_000:03d}::'
 
-    def message(self, message: str):
-        """ Log a message to the console. """
-        print(f"{self._prefix()}{message}")
+    def message(self, message: str, *args):
+        """ Log a message to the console. If args are given the message is %-formatted with them, that is only
+        done when the log is enabled so callers on hot paths can skip building the string """
+        if ENABLE_LOG:
+            if args:
+                message = message % args
+            print(f"{self._prefix()}{message}")
 
     def error(self, message: str):
         """ Log an error message to the console. """
-        print(f"ERROR::{self._prefix()}{message}")
\ No newline at end of file
+        print(f"ERROR::{self._prefix()}{message}")
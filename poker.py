@@ -2,21 +2,48 @@
 digital poker game """
 
 import os
-import multiprocessing as mp
-import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from enum import Enum
 import random
-from copy import copy, deepcopy
-from multiprocessing.spawn import freeze_support
+import bisect
 import itertools
-
-from fontTools.ttLib.tables.C_F_F_ import table_C_F_F_
+import math
+import numpy as np
 
 from player import CasinoPlayer
 
 from logger import Logger
 log = Logger()
 
+# bitboard layout, see Hand.to_bitboard: bit (suit_index * 13 + rank_index) is set for each card in the hand
+SUIT_MASKS = (0x1FFF, 0x1FFF << 13, 0x1FFF << 26, 0x1FFF << 39) # the 13 rank bits of each suit, in Suit order
+
+
+def _highest_straight(rank_word: int) -> int:
+    """ the rank index of the top card of the highest straight in a 13 bit rank word, -1 if there is no straight.
+    the ace also counts low, the wheel A-2-3-4-5 has a top card of 3 (the five) """
+    word = (rank_word << 1) | ((rank_word >> 12) & 1) # bit 0 is the low ace, bit n + 1 is rank index n
+    runs = word & (word >> 1) & (word >> 2) & (word >> 3) & (word >> 4) # bit n is set when word bits n to n+4 are
+    if runs == 0:
+        return -1
+    return runs.bit_length() + 2 # the highest run starts at word bit n, rank index n - 1, and ends 4 ranks higher
+
+
+# printable suits indexed by Suit.value - 1 and printable ranks indexed by CardRank.value
+SUIT_GLYPHS = ('♥', '♦', '♣', '♠')
+RANK_STRINGS = (None, None, '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A')
+
+# every 13 bit rank word precomputed, so a straight check on a hand or a single suit is one table load
+STRAIGHT_TABLE = tuple(_highest_straight(rank_word) for rank_word in range(1 << 13))
+
+# Cactus Kev card code, see Card.code: bits 16-28 one bit per rank, bits 12-15 the suit, bits 8-11 the rank index,
+# bits 0-5 the rank prime. the product of the primes of a set of cards only depends on their ranks
+RANK_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41) # indexed by rank index, CardRank.value - 2
+CODE_PRIME_MASK = 0x3F
+CODE_SUIT_MASK = 0xF000
+CODE_RANK_SHIFT = 16
+WHEEL_RANK_BITS = 0x100F # the rank word of A-2-3-4-5
+
 
 class Suit(Enum):
     """ Enum class for the suit of a card """
@@ -27,14 +54,7 @@ class Suit(Enum):
 
     def get_printable_suit(self):
         """ return the printable suit of a card """
-        if self.name == 'HEARTS':
-            return '♥'
-        elif self.name == 'DIAMONDS':
-            return '♦'
-        elif self.name == 'CLUBS':
-            return '♣'
-        elif self.name == 'SPADES':
-            return '♠'
+        return SUIT_GLYPHS[self.value - 1]
 
 
 class CardRank(Enum):
@@ -55,10 +75,7 @@ class CardRank(Enum):
 
     def get_printable_rank(self):
         """ return the printable rank of a card """
-        if self.value < 11:
-            return str(self.value)
-        else:
-            return self.name[0]
+        return RANK_STRINGS[self.value]
 
 
 class HandRank(Enum):
@@ -103,6 +120,10 @@ class GameState(Enum):
 
 class HandProbability:
     """ Probabilities for a 5 card hand, default is the known 5 card hand probabilities """
+    # one is built per scored card combination, slots keep them small and the field access fast
+    __slots__ = ('straight_flush', 'four_of_a_kind', 'full_house', 'flush',
+                 'straight', 'three_of_a_kind', 'two_pair', 'pair')
+
     def __init__(self):
         self.straight_flush =  0.0000139   # ((10c1)(4c1)-(4c1))/(52c5),          odds: 72,192.33
         self.four_of_a_kind =  0.0002401   # (13c1)(4c4)(12c1)(4c1)/(52c5),       odds: 4,165.33
@@ -114,15 +135,25 @@ class HandProbability:
         self.pair =            0.42256903  # (13c1)(4c2)(12c3)(4c1)^3/(52c5),     odds: 1.36
 
     def __sub__(self, other):
-        self.straight_flush -=  other.straight_flush
-        self.four_of_a_kind -=  other.four_of_a_kind
-        self.full_house -=      other.full_house
-        self.flush -=           other.flush
-        self.straight -=        other.straight
-        self.three_of_a_kind -= other.three_of_a_kind
-        self.two_pair -=        other.two_pair
-        self.pair -=            other.pair
-        return self
+        """ the difference of two probabilities as a new HandProbability, neither side is changed """
+        out = HandProbability.__new__(HandProbability) # every field is set below, skip the defaults
+        out.straight_flush =  self.straight_flush -  other.straight_flush
+        out.four_of_a_kind =  self.four_of_a_kind -  other.four_of_a_kind
+        out.full_house =      self.full_house -      other.full_house
+        out.flush =           self.flush -           other.flush
+        out.straight =        self.straight -        other.straight
+        out.three_of_a_kind = self.three_of_a_kind - other.three_of_a_kind
+        out.two_pair =        self.two_pair -        other.two_pair
+        out.pair =            self.pair -            other.pair
+        return out
+
+    @classmethod
+    def from_values(cls, values: tuple):
+        """ a HandProbability from the 8 probabilities in PROBABILITY_FIELDS order """
+        hp = cls.__new__(cls) # every field is set below, skip the defaults
+        (hp.straight_flush, hp.four_of_a_kind, hp.full_house, hp.flush,
+         hp.straight, hp.three_of_a_kind, hp.two_pair, hp.pair) = values
+        return hp
 
     def _set_all_to_zero(self):
         """ set all probabilities to zero """
@@ -139,37 +170,18 @@ class HandProbability:
         """ get the delta probability for a hand rank, note that this can be a + or - delta
         @param: filter: a list of HandRank objects to include, default is None (include all HandRanks)
         @return: HandProbability object with the delta probabilities for the hand ranks in the filter """
-        base_prob = HandProbability()
-        delta_prob = HandProbability()
+        base_prob = BASE_HAND_PROBABILITY
+        delta_prob = HandProbability.__new__(HandProbability) # zeroed below, skip the defaults
         delta_prob._set_all_to_zero()
         if filter is None:
-            filter = [HandRank.STRAIGHT_FLUSH, HandRank.FOUR_OF_A_KIND, HandRank.FULL_HOUSE,
-                      HandRank.FLUSH, HandRank.STRAIGHT, HandRank.THREE_OF_A_KIND,
-                      HandRank.TWO_PAIR, HandRank.PAIR]
+            filter = PROBABILITY_HAND_RANKS
 
         for hand_rank in filter: # type: HandRank
             base_prob_value =  base_prob.get_probability_for_rank(hand_rank)
             self_prob_value = self.get_probability_for_rank(hand_rank)
 
             # calculate the delta
-            delta = self_prob_value - base_prob_value
-
-            if hand_rank == HandRank.STRAIGHT_FLUSH:
-                delta_prob.straight_flush = delta
-            elif hand_rank == HandRank.FOUR_OF_A_KIND:
-                delta_prob.four_of_a_kind = delta
-            elif hand_rank == HandRank.FULL_HOUSE:
-                delta_prob.full_house = delta
-            elif hand_rank == HandRank.FLUSH:
-                delta_prob.flush = delta
-            elif hand_rank == HandRank.STRAIGHT:
-                delta_prob.straight = delta
-            elif hand_rank == HandRank.THREE_OF_A_KIND:
-                delta_prob.three_of_a_kind = delta
-            elif hand_rank == HandRank.TWO_PAIR:
-                delta_prob.two_pair = delta
-            elif hand_rank == HandRank.PAIR:
-                delta_prob.pair = delta
+            setattr(delta_prob, RANK_PROBABILITY_FIELDS[hand_rank], self_prob_value - base_prob_value)
 
         return delta_prob
 
@@ -193,92 +205,121 @@ class HandProbability:
         # in the case that you have two cards of different suite you can not get a flush, so the probability
         # of the flush goes to Zero resulting in a negative delta, this it typically not useful to sum these
 
-        hr = HandRank
+        # only the best hand rank with a change counts, so walk the ranks best first and stop at the first change
         if weights is None:
-            weights = {hr.STRAIGHT_FLUSH: 1,
-                        hr.FOUR_OF_A_KIND: 0.9,
-                        hr.FULL_HOUSE: 0.8,
-                        hr.FLUSH: 0.7,
-                        hr.STRAIGHT: 0.6,
-                        hr.THREE_OF_A_KIND: 0.5,
-                        hr.TWO_PAIR: 0.4,
-                        hr.PAIR: 0.3,}
-        delta_prob = self.get_delta_probability()
-
-        # iterate over delta_prob and set to 0 if ignore_negatives is True and the value is negative
-        if ignore_negatives is True:
-            zd = copy(delta_prob)
-            for key, value in vars(delta_prob).items():
-                if value < 0:
-                    zd.__setattr__(key, 0)
-                else:
-                    zd.__setattr__(key, value)
-            delta_prob = zd
-
-        # iterate over the delta probabilities and multiply by the weights
-        rsum = 0  # running sum
-        if delta_prob.straight_flush != 0:
-            rsum += delta_prob.straight_flush * weights.get(hr.STRAIGHT_FLUSH, 1)
-        elif delta_prob.four_of_a_kind != 0:
-            rsum += delta_prob.four_of_a_kind * weights.get(hr.FOUR_OF_A_KIND, 0.9)
-        elif delta_prob.full_house != 0:
-            rsum += delta_prob.full_house * weights.get(hr.FULL_HOUSE, 0.8)
-        elif delta_prob.flush != 0:
-            rsum += delta_prob.flush * weights.get(hr.FLUSH, 0.7)
-        elif delta_prob.straight != 0:
-            rsum += delta_prob.straight * weights.get(hr.STRAIGHT, 0.6)
-        elif delta_prob.three_of_a_kind != 0:
-            rsum += delta_prob.three_of_a_kind * weights.get(hr.THREE_OF_A_KIND, 0.5)
-        elif delta_prob.two_pair != 0:
-            rsum += delta_prob.two_pair * weights.get(hr.TWO_PAIR, 0.4)
-        elif delta_prob.pair != 0:
-            rsum += delta_prob.pair * weights.get(hr.PAIR, 0.3)
-        return rsum
-
+            weights = DEFAULT_PROBABILITY_WEIGHTS
+        base_prob = BASE_HAND_PROBABILITY
+        for hand_rank, field in zip(PROBABILITY_HAND_RANKS, PROBABILITY_FIELDS):
+            delta = getattr(self, field) - getattr(base_prob, field)
+            if ignore_negatives is True and delta < 0:
+                continue
+            if delta != 0:
+                return delta * weights.get(hand_rank, DEFAULT_PROBABILITY_WEIGHTS[hand_rank])
+        return 0
 
     def get_probability_for_rank(self, hand_rank: HandRank):
         """ get the probability of a hand rank
         Warning, when a game is active these probabilities may be updated from default depending on the existing hand """
-        if hand_rank == HandRank.STRAIGHT_FLUSH:
-            return self.straight_flush
-        elif hand_rank == HandRank.FOUR_OF_A_KIND:
-            return self.four_of_a_kind
-        elif hand_rank == HandRank.FULL_HOUSE:
-            return self.full_house
-        elif hand_rank == HandRank.FLUSH:
-            return self.flush
-        elif hand_rank == HandRank.STRAIGHT:
-            return self.straight
-        elif hand_rank == HandRank.THREE_OF_A_KIND:
-            return self.three_of_a_kind
-        elif hand_rank == HandRank.TWO_PAIR:
-            return self.two_pair
-        elif hand_rank == HandRank.PAIR:
-            return self.pair
-        else:
+        field = RANK_PROBABILITY_FIELDS.get(hand_rank)
+        if field is None:
             raise Exception('Invalid hand rank')
+        return getattr(self, field)
+
+
+# built once and only read, the defaults that get_delta_probability compares against
+BASE_HAND_PROBABILITY = HandProbability()
+
+# the hand ranks that have a probability, best first, and the matching HandProbability fields
+PROBABILITY_HAND_RANKS = (HandRank.STRAIGHT_FLUSH, HandRank.FOUR_OF_A_KIND, HandRank.FULL_HOUSE,
+                          HandRank.FLUSH, HandRank.STRAIGHT, HandRank.THREE_OF_A_KIND,
+                          HandRank.TWO_PAIR, HandRank.PAIR)
+PROBABILITY_FIELDS = HandProbability.__slots__ # the same order as PROBABILITY_HAND_RANKS
+RANK_PROBABILITY_FIELDS = dict(zip(PROBABILITY_HAND_RANKS, PROBABILITY_FIELDS)) # like {HandRank.PAIR: 'pair', ...}
+
+# the default weights of get_delta_probability_sum
+DEFAULT_PROBABILITY_WEIGHTS = {HandRank.STRAIGHT_FLUSH: 1,
+                               HandRank.FOUR_OF_A_KIND: 0.9,
+                               HandRank.FULL_HOUSE: 0.8,
+                               HandRank.FLUSH: 0.7,
+                               HandRank.STRAIGHT: 0.6,
+                               HandRank.THREE_OF_A_KIND: 0.5,
+                               HandRank.TWO_PAIR: 0.4,
+                               HandRank.PAIR: 0.3,}
+
+
+def _build_two_card_probabilities() -> dict:
+    """ the probabilities of every kind of 2 card hand, keyed by (pair, suited, connected) where connected is two
+    adjacent ranks, the values are in PROBABILITY_FIELDS order for HandProbability.from_values """
+    table = {}
+    for pair, suited, connected in itertools.product((False, True), repeat=3):
+        hp = HandProbability()
+        if pair: # if you have a pair, there is some chance you will get other nice hands
+            hp.pair            = 1
+            hp.two_pair        = 0.269   # brute force calculated 1M hands
+            hp.three_of_a_kind = 0.119   # brute force calculated 1M hands
+            hp.full_house      = 0.00995 # 1M hands
+            hp.four_of_a_kind  = 0.0024  # 10M hands
+            hp.straight        = 0.0     # you can't have a pair and a straight
+            hp.straight_flush  = 0.0
+
+        if suited:
+            hp.flush = 0.0084 # Brute force calculated 1M hands
+
+        if connected:
+            hp.straight = 0.01312 # 1M hands
+            hp.straight_flush = 0.0  # since you have two suites that are not equal
+            if suited:
+                hp.straight_flush =  0.000197
+        table[(pair, suited, connected)] = tuple(getattr(hp, field) for field in PROBABILITY_FIELDS)
+    return table
+
+
+TWO_CARD_PROBABILITIES = _build_two_card_probabilities()
+
+
+_CARD_BY_KEY = {} # type: dict[tuple[CardRank, Suit], Card] # every card made so far by (rank, suit), see Card.__new__
 
 
 class Card:
-    """ Class for a card object """
-    def __init__(self, rank: CardRank, suit: Suit):
+    """ Class for a card object, there is one instance of each of the 52 cards, Card(rank, suit) returns the existing
+    one so cards compare and hash by identity """
+    def __new__(cls, rank: CardRank, suit: Suit):
         if isinstance(rank, int):
             rank = CardRank(rank)
+        self = _CARD_BY_KEY.get((rank, suit))
+        if self is not None:
+            return self
+        self = super().__new__(cls)
         self.rank = rank
         self.suit = suit
+        self.bit = (suit.value - 1) * 13 + rank.value - 2 # the bit index of the card on a hand bitboard, see SUIT_MASKS
+        rank_index = rank.value - 2
+        self.code = (1 << (CODE_RANK_SHIFT + rank_index)) | (1 << (11 + suit.value)) | (rank_index << 8) | RANK_PRIMES[rank_index]
+        ps = suit.get_printable_suit()
+        self._str = f'({ps} {rank.name} {ps})' # formatted once, cards are logged on every bet
+        _CARD_BY_KEY[(rank, suit)] = self
+        return self
+
+    def __reduce__(self):
+        """ a pickled card, like one sent to a process pool, unpickles to the existing instance """
+        return Card, (self.rank, self.suit)
 
     def __str__(self):
-        ps = self.suit.get_printable_suit()
-        return f'({ps} {self.rank.name} {ps})'
+        return self._str
 
     def __repr__(self):
         return self.__str__()
 
     def __eq__(self, other):
+        if self is other: # there is one instance of each card, see __new__
+            return True
         if self.rank == other.rank and self.suit == other.suit:
             return True
         return False
 
+    def __hash__(self):
+        return self.bit # equal cards have the same bit
+
     def __gt__(self, other):
         return self.rank.value > other.rank.value
 
@@ -286,18 +327,272 @@ class Card:
         return self.rank.value - other.rank.value
 
 
+# the 52 cards, built once and shared by every deck
+ALL_CARDS = tuple(Card(rank, suit) for suit in Suit for rank in CardRank)
+
+# the 7 printed rows of a card, each card's rows are formatted once here and placed side by side by get_string_hand
+CARD_ART_TEMPLATE = ('+--------+ ',
+                     '|{r:<8}| ',
+                     '|        | ',
+                     '|    {s}   | ',
+                     '|        | ',
+                     '|{r:>8}| ',
+                     '+--------+ ')
+_CARD_ART = {card.bit: tuple(row.format(r=card.rank.get_printable_rank(), s=card.suit.get_printable_suit())
+                             for row in CARD_ART_TEMPLATE)
+             for card in ALL_CARDS}
+
+
+def _build_5_card_lookup() -> tuple:
+    """ build the Cactus Kev 5 card lookup, every 5 card hand is one of 7462 classes from 1 (a royal flush) to
+    7462 (7-5-4-3-2 unsuited), a lower class beats a higher one. flushes are keyed by the 13 bit rank word of the
+    hand, every other hand by the product of its rank primes, see Card.code
+    @return: (flush_lookup, unsuited_lookup, class_rank_values) the two lookups give the class of a hand and
+    class_rank_values is the HandRank value of each class, indexed by class """
+    flush_lookup = {}
+    unsuited_lookup = {}
+    class_rank_values = [HandRank.INITIAL.value] # class 0 is not used
+    ranks_desc = tuple(range(12, -1, -1)) # rank indexes, best first
+    straights = [WHEEL_RANK_BITS if top == 3 else 0b11111 << (top - 4) for top in range(12, 2, -1)] # best first
+    # five distinct ranks that are not a straight, best first, comparing the top cards first is the same as
+    # comparing the rank words as numbers
+    straight_set = set(straights)
+    no_straights = [word for word in sorted((sum(1 << rank for rank in ranks) for ranks in itertools.combinations(range(13), 5)),
+                                            reverse=True) if word not in straight_set]
+
+    def prime_product(ranks) -> int:
+        product = 1
+        for rank in ranks:
+            product *= RANK_PRIMES[rank]
+        return product
+
+    def word_ranks(word: int) -> list:
+        return [rank for rank in range(13) if word >> rank & 1]
+
+    def add(lookup: dict, key: int, hand_rank: HandRank):
+        lookup[key] = len(class_rank_values)
+        class_rank_values.append(hand_rank.value)
+
+    # combinations of the descending ranks come out best first
+    for word in straights:
+        add(flush_lookup, word, HandRank.STRAIGHT_FLUSH)
+    for quads in ranks_desc:
+        for kicker in ranks_desc:
+            if kicker != quads:
+                add(unsuited_lookup, prime_product((quads,) * 4 + (kicker,)), HandRank.FOUR_OF_A_KIND)
+    for trips in ranks_desc:
+        for pair in ranks_desc:
+            if pair != trips:
+                add(unsuited_lookup, prime_product((trips,) * 3 + (pair,) * 2), HandRank.FULL_HOUSE)
+    for word in no_straights:
+        add(flush_lookup, word, HandRank.FLUSH)
+    for word in straights:
+        add(unsuited_lookup, prime_product(word_ranks(word)), HandRank.STRAIGHT)
+    for trips in ranks_desc:
+        for kickers in itertools.combinations([rank for rank in ranks_desc if rank != trips], 2):
+            add(unsuited_lookup, prime_product((trips,) * 3 + kickers), HandRank.THREE_OF_A_KIND)
+    for high_pair, low_pair in itertools.combinations(ranks_desc, 2):
+        for kicker in ranks_desc:
+            if kicker != high_pair and kicker != low_pair:
+                add(unsuited_lookup, prime_product((high_pair, high_pair, low_pair, low_pair, kicker)), HandRank.TWO_PAIR)
+    for pair in ranks_desc:
+        for kickers in itertools.combinations([rank for rank in ranks_desc if rank != pair], 3):
+            add(unsuited_lookup, prime_product((pair, pair) + kickers), HandRank.PAIR)
+    for word in no_straights:
+        add(unsuited_lookup, prime_product(word_ranks(word)), HandRank.HIGH_CARD)
+
+    if len(class_rank_values) != 7463:
+        raise Exception(f'Invalid 5 card lookup, {len(class_rank_values) - 1} classes')
+    return flush_lookup, unsuited_lookup, tuple(class_rank_values)
+
+
+FLUSH_LOOKUP, UNSUITED_LOOKUP, CLASS_RANK_VALUES = _build_5_card_lookup()
+
+
+_UNSUITED_N_CARD_LOOKUPS = {} # type: dict[int, dict[int, int]] # see _unsuited_n_card_lookup
+_UNSUITED_N_CARD_ARRAYS = {} # type: dict[int, tuple[np.ndarray, np.ndarray]] # see _unsuited_n_card_arrays
+
+
+def _best_flush_class(word: int) -> int:
+    """ the class of the best 5 cards of a flush given as the 13 bit rank word of 5 or more cards of one suit """
+    top = STRAIGHT_TABLE[word]
+    if top >= 0: # the highest straight flush
+        return FLUSH_LOOKUP[WHEEL_RANK_BITS if top == 3 else 0b11111 << (top - 4)]
+    while word.bit_count() > 5: # the 5 highest ranks are the best flush
+        word &= word - 1
+    return FLUSH_LOOKUP[word]
+
+
+# _best_flush_class of every rank word of 5 or more ranks, 0 for the others, for score_many
+BEST_FLUSH_CLASS_TABLE = np.array([_best_flush_class(word) if word.bit_count() >= 5 else 0 for word in range(1 << 13)],
+                                  dtype=np.int16)
+
+
+def _unsuited_n_card_lookup(n_cards: int) -> dict:
+    """ the best class of every hand of 6 or 7 cards with no flush, keyed by the product of the rank primes of all
+    the cards like UNSUITED_LOOKUP is for 5 cards. the class only depends on the ranks so each 5 card product is
+    extended by every choice of the other ranks, about 50k products for 7 cards built in a tenth of a second on first
+    use (products of five of a kind are never looked up) """
+    lookup = _UNSUITED_N_CARD_LOOKUPS.get(n_cards)
+    if lookup is None:
+        extras = [math.prod(ranks) for ranks in itertools.combinations_with_replacement(RANK_PRIMES, n_cards - 5)]
+        lookup = {}
+        get = lookup.get
+        for product, hand_class in UNSUITED_LOOKUP.items():
+            for extra in extras:
+                key = product * extra
+                if hand_class < get(key, 7463):
+                    lookup[key] = hand_class
+        _UNSUITED_N_CARD_LOOKUPS[n_cards] = lookup
+    return lookup
+
+
+def _unsuited_n_card_arrays(n_cards: int) -> tuple:
+    """ _unsuited_n_card_lookup as (sorted products, classes) arrays for np.searchsorted, built on first use """
+    arrays = _UNSUITED_N_CARD_ARRAYS.get(n_cards)
+    if arrays is None:
+        lookup = _unsuited_n_card_lookup(n_cards)
+        products = np.array(sorted(lookup), dtype=np.int64)
+        arrays = products, np.array([lookup[product] for product in products.tolist()], dtype=np.int16)
+        _UNSUITED_N_CARD_ARRAYS[n_cards] = arrays
+    return arrays
+
+
+def _5_card_class(a: int, b: int, c: int, d: int, e: int) -> int:
+    """ the Cactus Kev class of 5 cards given as Card.code, one AND for the flush check then one lookup by the rank
+    word or the product of the rank primes, see _build_5_card_lookup """
+    if a & b & c & d & e & CODE_SUIT_MASK:
+        return FLUSH_LOOKUP[(a | b | c | d | e) >> CODE_RANK_SHIFT]
+    return UNSUITED_LOOKUP[(a & CODE_PRIME_MASK) * (b & CODE_PRIME_MASK) * (c & CODE_PRIME_MASK) * (d & CODE_PRIME_MASK)
+                           * (e & CODE_PRIME_MASK)]
+
+
+# the lookup as arrays for the batched showdown, flushes by rank word (0 is not a flush) and every other hand by
+# searching the sorted prime products
+FLUSH_CLASS_TABLE = np.zeros(1 << 13, dtype=np.int16)
+FLUSH_CLASS_TABLE[list(FLUSH_LOOKUP)] = list(FLUSH_LOOKUP.values())
+UNSUITED_PRODUCTS = np.array(sorted(UNSUITED_LOOKUP), dtype=np.int64)
+UNSUITED_CLASSES = np.array([UNSUITED_LOOKUP[product] for product in UNSUITED_PRODUCTS.tolist()], dtype=np.int16)
+CLASS_RANK_VALUE_TABLE = np.array(CLASS_RANK_VALUES, dtype=np.int8)
+CARD_CODES = np.array([card.code for card in ALL_CARDS], dtype=np.int64) # Card.code by Card.bit
+
+
+def _lookup_classes_np(suited: np.ndarray, words: np.ndarray, products: np.ndarray) -> np.ndarray:
+    """ the Cactus Kev classes of 5 card hands from the lookup arrays
+    @param: suited: the AND of the 5 codes masked by CODE_SUIT_MASK, not 0 for a flush
+    @param: words: the OR of the 5 codes shifted down by CODE_RANK_SHIFT
+    @param: products: the product of the 5 rank primes """
+    return np.where(suited != 0, FLUSH_CLASS_TABLE[words], UNSUITED_CLASSES[np.searchsorted(UNSUITED_PRODUCTS, products)])
+
+
+def _lookup_rank_values_np(suited: np.ndarray, words: np.ndarray, products: np.ndarray) -> np.ndarray:
+    """ the HandRank values of 5 card hands from the lookup arrays, see _lookup_classes_np """
+    return CLASS_RANK_VALUE_TABLE[_lookup_classes_np(suited, words, products)]
+
+
+def _5_card_classes_np(codes: np.ndarray) -> np.ndarray:
+    """ the Cactus Kev classes of many 5 card hands in one pass
+    @param: codes: a (..., 5) array of Card.code, see CARD_CODES
+    @return: a (...) array of classes """
+    suited = np.bitwise_and.reduce(codes, axis=-1) & CODE_SUIT_MASK
+    words = np.bitwise_or.reduce(codes, axis=-1) >> CODE_RANK_SHIFT
+    products = np.prod(codes & CODE_PRIME_MASK, axis=-1)
+    return _lookup_classes_np(suited, words, products)
+
+
+def _score_5_card_hands_np(codes: np.ndarray) -> np.ndarray:
+    """ score many 5 card hands in one pass
+    @param: codes: a (N, 5) array of Card.code, see CARD_CODES
+    @return: a (N,) array of HandRank values """
+    return CLASS_RANK_VALUE_TABLE[_5_card_classes_np(codes)]
+
+
+_COMBINATION_INDEXES = {} # type: dict[tuple[int, int], np.ndarray] # see _combination_indexes
+
+
+def _combination_indexes(n: int, k: int) -> np.ndarray:
+    """ the positions of every k of n items in itertools.combinations order as a (comb(n, k), k) array, built once
+    for each n and k straight from the combinations iterator into an array of the known size """
+    indexes = _COMBINATION_INDEXES.get((n, k))
+    if indexes is None:
+        count = math.comb(n, k)
+        indexes = np.fromiter(itertools.chain.from_iterable(itertools.combinations(range(n), k)), dtype=np.intp,
+                              count=count * k).reshape(count, k)
+        _COMBINATION_INDEXES[(n, k)] = indexes
+    return indexes
+
+
+def score_many(cards: np.ndarray) -> np.ndarray:
+    """ the Cactus Kev class of the best 5 cards of many hands in one numpy pass, the batched Hand.get_hand_class
+    @param: cards: a (N, 5), (N, 6) or (N, 7) integer array of Card.bit (the index into ALL_CARDS), one hand per row
+    @return: a (N,) array of classes from 1 (a royal flush) to 7462, CLASS_RANK_VALUE_TABLE[classes] are the HandRank
+    values. like Hand.get_hand_class a bigger hand is one lookup of its best flush or of the product of its rank primes
+    """
+    cards = np.asarray(cards, dtype=np.intp) # an int8 row of to_bit_array would overflow the rank bit shifts
+    if cards.ndim != 2 or not 5 <= cards.shape[1] <= 7:
+        raise ValueError(f"Invalid hands to score: shape {cards.shape}, must be (N, 5) to (N, 7)")
+    codes = CARD_CODES[cards]
+    if cards.shape[1] == 5:
+        return _5_card_classes_np(codes)
+
+    # the rank word of each suit of each hand, at most one suit of 7 cards can hold 5
+    suit_words = np.zeros((len(cards), 4), dtype=np.int64)
+    rows = np.arange(len(cards))
+    for column in cards.T:
+        suit_words[rows, column // 13] |= 1 << (column % 13)
+    flush_words = np.where(POPCOUNT_TABLE[suit_words] >= 5, suit_words, 0).max(axis=1)
+    products, classes = _unsuited_n_card_arrays(cards.shape[1])
+    unsuited = classes[np.searchsorted(products, np.prod(codes & CODE_PRIME_MASK, axis=1))]
+    return np.where(flush_words != 0, BEST_FLUSH_CLASS_TABLE[flush_words], unsuited)
+
+
+def _best_5_card_candidates_np(hand_codes: np.ndarray, board_codes: np.ndarray) -> tuple:
+    """ find the best 5 cards made of a hand pair and a board triplet for many hands at once, the work of the showdown
+    @param: hand_codes: (P, H) the Card.code of every hand card, one row per player
+    @param: board_codes: (B,) the Card.code of every board card
+    @return: (values, pair_indexes, triplet_indexes) each (P,), the HandRank value and the position in
+    itertools.combinations order of the first candidate with the best HandRank of each hand. the value is 0 if there
+    are no candidates """
+    n_hands = len(hand_codes)
+    pairs = _combination_indexes(hand_codes.shape[1], 2)
+    triplets = _combination_indexes(len(board_codes), 3)
+    if len(pairs) == 0 or len(triplets) == 0:
+        zeros = np.zeros(n_hands, dtype=np.intp)
+        return zeros, zeros, zeros
+
+    pair_a = hand_codes[:, pairs[:, 0]] # (P, n pairs)
+    pair_b = hand_codes[:, pairs[:, 1]]
+    board = board_codes[triplets] # (n triplets, 3)
+    triplet_and = board[:, 0] & board[:, 1] & board[:, 2]
+    triplet_or = board[:, 0] | board[:, 1] | board[:, 2]
+    triplet_product = (board[:, 0] & CODE_PRIME_MASK) * (board[:, 1] & CODE_PRIME_MASK) * (board[:, 2] & CODE_PRIME_MASK)
+
+    # every candidate, (P, n pairs, n triplets)
+    suited = ((pair_a & pair_b)[:, :, None] & triplet_and) & CODE_SUIT_MASK
+    words = ((pair_a | pair_b)[:, :, None] | triplet_or) >> CODE_RANK_SHIFT
+    products = ((pair_a & CODE_PRIME_MASK) * (pair_b & CODE_PRIME_MASK))[:, :, None] * triplet_product
+    values = _lookup_rank_values_np(suited, words, products).reshape(n_hands, -1)
+
+    best = values.argmax(axis=1) # the first best, pair major so the same as the order of a pair then triplet loop
+    n_triplets = len(triplets)
+    return values[np.arange(n_hands), best], best // n_triplets, best % n_triplets
+
+
+def _card_rank_value(card: Card) -> int:
+    """ the sort key for cards """
+    return card.rank.value
+
+
 class Deck:
     """ Class for a deck object """
     def __init__(self):
         self.cards = [] # cards are popped when dealt, this represents the deck in play
         self.build()    # adds the cards to the deck
-        self._all_cards = copy(self.cards) # used to store cards for resetting the deck / game
+        self._all_cards = tuple(self.cards) # used to store cards for resetting the deck / game, cards are shared not copied
 
     def build(self):
-        """ create a deck of 52 cards """
-        for suit in Suit:
-            for rank in CardRank:
-                self.cards.append(Card(rank, suit))
+        """ create a deck of 52 cards, the cards are the shared ALL_CARDS """
+        self.cards.extend(ALL_CARDS)
 
     def shuffle(self):
         """ shuffle the deck """
@@ -309,13 +604,10 @@ class Deck:
 
     def reset_deck(self):
         """ reset the deck to the original state """
-        self.cards = copy(self._all_cards)
+        self.cards = list(self._all_cards)
 
     def __str__(self):
-        deck_str = ''
-        for card in self.cards:
-            deck_str += f'{card}\n'
-        return deck_str
+        return ''.join(f'{card}\n' for card in self.cards)
 
 
 class PartialDeck(Deck):
@@ -323,15 +615,31 @@ class PartialDeck(Deck):
     def __init__(self, throw_out_cards=[]):
         """ pass a list of cards to throw out to the constructor. This deck will never contain those cards """
         super().__init__()
-        for card in throw_out_cards:
-            self.cards.remove(card)
-            self._all_cards.remove(card)
+        removed = set(throw_out_cards)
+        self.cards = [card for card in ALL_CARDS if card not in removed]
+        self._all_cards = tuple(self.cards)
+
+
+SCORED_BOARD_CACHE_SIZE = 1 << 16 # entries kept by _SCORED_BOARD_CACHE before it is cleared
+_SCORED_BOARD_CACHE = {} # type: dict[int, int] # bitboard -> _achieved_of_board mask, see Hand.score_5_or_7_card_hand
+
+
+def _achieved_of_board(board: int, cards: list) -> int:
+    """ the _achieved_hand_ranks mask of a bitboard for Hand.score_5_or_7_card_hand, one lookup of the class of a 5
+    card hand or one pass over the bitboard
+    @param: cards: the cards of the bitboard """
+    if len(cards) == 5:
+        a, b, c, d, e = cards
+        return CLASS_ACHIEVED_MASKS[_5_card_class(a.code, b.code, c.code, d.code, e.code)]
+    return _achieved_hand_ranks(board)
 
 
 class Hand:
     """ Class for a hand object """
     def __init__(self):
         self.cards = []
+        self._sorted = [] # type: list[Card] # the cards sorted by rank, kept in step with add_cards
+        self.mask = 0 # the bitboard of the cards, kept in step with add_cards, see to_bitboard
         self.hand_rank = HandRank.INITIAL
         self.straight_cards = []  # type: list[Card]
         self.winning_cards = []  # type: list[Card]
@@ -346,12 +654,22 @@ class Hand:
     def add_cards(self, cards: list):
         """ add a card to the hand """
         self.cards.extend(cards)
+        for card in cards:
+            self.mask |= 1 << card.bit
+            bisect.insort(self._sorted, card, key=_card_rank_value) # after equal ranks, same order as a stable sort
+
+    def remove_card(self, card: Card):
+        """ remove a card from the hand, the sorted cards are updated with a bisect instead of a new sort """
+        self.cards.remove(card)
+        idx = bisect.bisect_left(self._sorted, card.rank.value, key=_card_rank_value)
+        while self._sorted[idx] != card:
+            idx += 1
+        self._sorted.pop(idx)
+        if card not in self.cards:
+            self.mask &= ~(1 << card.bit)
 
     def __str__(self):
-        hand_str = ''
-        for card in self.cards:
-            hand_str += f'{card} '
-        return hand_str
+        return ''.join(f'{card} ' for card in self.cards)
 
     def __repr__(self):
         l = str([c for c in self.cards])
@@ -362,201 +680,123 @@ class Hand:
         """ print the hand,
         @ cards: a list of cards to print instead of the hand if None
                         the existing hand will be printed"""
-        if cards is None:
-            cards = self.cards
-        for card in cards:
-            print('+--------+ ', end='')
-        print()
-        for card in cards:
-            rnk = card.rank.get_printable_rank()
-            if rnk != '10':
-                print(f'|{rnk}       | ', end='')
-            else:
-                print(f'|{rnk}      | ', end='')
-        print()
-        for card in cards:
-            print('|        | ', end='')
-        print()
-        for card in cards:
-            print(f'|    {card.suit.get_printable_suit()}   | ', end='')
-        print()
-        for card in cards:
-            print('|        | ', end='')
-        print()
-        for card in cards:
-            rnk = card.rank.get_printable_rank()
-            if rnk != '10':
-                print(f'|       {rnk}| ', end='')
-            else:
-                print(f'|      {rnk}| ', end='')
-        print()
-        for card in cards:
-            print('+--------+ ', end='')
-        print()
+        print(self.get_string_hand(cards), end='')
 
     def get_string_hand(self, cards=None):
         """ same as print_hand but returns a string """
         if cards is None:
             cards = self.cards
-        hand_str = ''
-        for card in cards:
-            hand_str += '+--------+ '
-        hand_str += '\n'
-        for card in cards:
-            rnk = card.rank.get_printable_rank()
-            if rnk != '10':
-                hand_str += f'|{rnk}       | '
-            else:
-                hand_str += f'|{rnk}      | '
-        hand_str += '\n'
-        for card in cards:
-            hand_str += '|        | '
-        hand_str += '\n'
-        for card in cards:
-            hand_str += f'|    {card.suit.get_printable_suit()}   | '
-        hand_str += '\n'
-        for card in cards:
-            hand_str += '|        | '
-        hand_str += '\n'
-        for card in cards:
-            rnk = card.rank.get_printable_rank()
-            if rnk != '10':
-                hand_str += f'|       {rnk}| '
-            else:
-                hand_str += f'|      {rnk}| '
-        hand_str += '\n'
-        for card in cards:
-            hand_str += '+--------+ '
-        hand_str += '\n'
-        return hand_str
+        art = [_CARD_ART[card.bit] for card in cards]
+        return ''.join(''.join(card_art[row] for card_art in art) + '\n' for row in range(len(CARD_ART_TEMPLATE)))
+
+    def to_bitboard(self) -> int:
+        """ the hand as a 52 bit integer, bit (suit_index * 13 + rank_index) is set for each card, see SUIT_MASKS """
+        return self.mask
+
+    def to_bit_array(self) -> np.ndarray:
+        """ the hand as an int8 array of Card.bit in card order, a row for score_many and the other numpy kernels. the
+        rank index is bit % 13 and the suit index bit // 13 """
+        return np.fromiter((card.bit for card in self.cards), dtype=np.int8, count=len(self.cards))
+
+    def get_hand_class(self) -> int:
+        """ the Cactus Kev class of the best 5 cards of a hand of 5 to 7 cards, from 1 (a royal flush) to 7462, a lower
+        class beats a higher one. unlike hand_rank it also orders hands of the same rank, see _build_5_card_lookup
+        a 5 card hand is one lookup, a bigger hand one lookup of its best flush or of its rank primes """
+        codes = [card.code for card in self.cards]
+        if len(codes) == 5:
+            return _5_card_class(*codes)
+        if len(codes) not in (6, 7):
+            raise ValueError(f"Invalid number of cards to classify: {len(codes)}, must be 5 to 7")
+
+        # with 6 or 7 cards a flush leaves too few other cards for four of a kind or a full house, so a flush hand
+        # is the best flush of its suit with no subsets to try. otherwise no subset is a flush and the hand is one
+        # lookup of the product of all its rank primes
+        board = self.mask
+        for mask in SUIT_MASKS:
+            word = (board & mask) >> (mask.bit_length() - 13)
+            if word.bit_count() >= 5:
+                return _best_flush_class(word)
+        return _unsuited_n_card_lookup(len(codes))[math.prod(code & CODE_PRIME_MASK for code in codes)]
 
     def score_5_or_7_card_hand(self, print_cards_and_rank=False) -> list:
         """ score the hand of 5 cards
         @param: print_cards_and_rank: if True, print the cards and the rank of the hand
         @return: list of ranks achieved by the hand, includes all achieved like [HandRank.PAIR, HandRank.FLUSH, HandRank.THREE_OF_A_KIND]
         """
-        self.hand_rank = HandRank.INITIAL
-        ranks = [] # a list of all ranks achieved in hand
-
-        # make copy and sort the cards
-        tmp = copy(self.cards)
-        tmp.sort(key=lambda x: x.rank.value)
+        # the cards sorted by rank, kept by add_cards so there is no sort here. only read, never changed
+        tmp = self._sorted
         # self.print_hand(tmp)
 
-        # check for high card
-        self.hand_rank = HandRank.HIGH_CARD
-        ranks.append(HandRank.HIGH_CARD)
-        self.significant_high_card = tmp[-1]
-        self.winning_cards.append(self.significant_high_card)
-
-        # check for pairs
-        pair_count = 0
-        for i in range(len(tmp) - 1):
-            if tmp[i].rank == tmp[i+1].rank:
-                if pair_count == 0:
-                    self.significant_high_card = tmp[i]
-                    pair_count = 1
-                    self.winning_cards = [tmp[i], tmp[i+1]]
-                if pair_count == 1:
-                    if tmp[i+1].rank == self.significant_high_card.rank:
-                        continue # this is either a 3 or 4 of a kind, don't count it as 2 pair
-                    else:
-                        pair_count = 2
-                        self.winning_cards += [tmp[i], tmp[i+1]]
-
-
-        if pair_count == 1:
-            self.hand_rank = HandRank.PAIR
-            ranks.append(HandRank.PAIR)
-        elif pair_count == 2:
-            self.hand_rank = HandRank.TWO_PAIR
-            ranks.append(HandRank.PAIR)
-            ranks.append(HandRank.TWO_PAIR)
-
-        # check for three of a kind
-        three_of_a_kind = [] # this is used later for full house check
-        for i in range(len(tmp) - 2): # convolve the pattern and the list
-            if tmp[i].rank == tmp[i + 1].rank == tmp[i + 2].rank:
-                self.hand_rank = HandRank.THREE_OF_A_KIND
-                ranks.append(HandRank.THREE_OF_A_KIND)
-                self.significant_high_card = tmp[i+2]
-                three_of_a_kind.append(tmp[i])
-                three_of_a_kind.append(tmp[i+1])
-                three_of_a_kind.append(tmp[i+2])
-                self.winning_cards = three_of_a_kind
-                break
-
-        # check for straight
-        straight = False
-        # check for duplicates, creates a list of unique rank cards
-        unique_rank_values = []
-        unique_rank_cards = []
-        for card in tmp:
-            if card.rank.value not in unique_rank_values:
-                unique_rank_values.append(card.rank.value)
-                unique_rank_cards.append(card)
-
-        # check distance between each unique rank card
-        distances = []
-        for i in range(len(unique_rank_cards) - 1):
-            distances.append(unique_rank_cards[i+1].rank.value - unique_rank_cards[i].rank.value)
-        # print(f"distances: {distances}")
-        pattern = [1, 1, 1, 1]
-        rng = range(len(unique_rank_cards) - 4)
-        for i in rng:
-            slice = distances[i:i+4]
-            # print(f"Slice {i}: {slice}")
-            if slice == pattern:
-                self.hand_rank = HandRank.STRAIGHT
-                ranks.append(HandRank.STRAIGHT)
-                straight = True
-                self.straight_cards = unique_rank_cards[i:i+5]
-                self.winning_cards = self.straight_cards
-                break
-
-        # check for flush
-        flush = False
-        for suit in Suit:
-            check = [card for card in tmp if card.suit == suit]
-            if len(check) >= 5:
-                self.hand_rank = HandRank.FLUSH
-                ranks.append(HandRank.FLUSH)
-                flush = True
-                self.winning_cards = check
-                break
-
-        # check for full house
-        if self.hand_rank == HandRank.THREE_OF_A_KIND:
-            lcl = copy(tmp)
-            for card in tmp:
-                if card.rank.value == self.significant_high_card.rank.value:
-                    lcl.remove(card) # this removes all the three of a kind cards
-
-            for i in range(len(lcl) - 1):
-                if lcl[i].rank == lcl[i+1].rank:
-                    self.hand_rank = HandRank.FULL_HOUSE
-                    ranks.append(HandRank.FULL_HOUSE)
-                    three_of_a_kind.append(lcl[i])
-                    three_of_a_kind.append(lcl[i+1])
-                    self.winning_cards = three_of_a_kind
-
-        # check for four of a kind
-        for i in range(len(tmp) - 3):
-            if tmp[i].rank == tmp[i+1].rank == tmp[i+2].rank == tmp[i+3].rank:
-                self.hand_rank = HandRank.FOUR_OF_A_KIND
-                ranks.append(HandRank.FOUR_OF_A_KIND)
-                self.significant_high_card = tmp[i]
-                self.winning_cards = [tmp[i], tmp[i+1], tmp[i+2], tmp[i+3]]
-
-        # check for straight flush
-        if straight and flush:
-            for card in self.straight_cards:
-                if card.suit.value != self.straight_cards[0].suit.value:
+        # the classification only depends on which cards are held so it is cached by the bitboard, only the mask is
+        # kept, the rank words below are a few ANDs of the bitboard. the winning cards depend on the order of the cards
+        # and are picked every time
+        board = self.mask
+        achieved = _SCORED_BOARD_CACHE.get(board)
+        if achieved is None:
+            achieved = _achieved_of_board(board, tmp)
+            if len(_SCORED_BOARD_CACHE) >= SCORED_BOARD_CACHE_SIZE:
+                _SCORED_BOARD_CACHE.clear()
+            _SCORED_BOARD_CACHE[board] = achieved
+        ranks = [hand_rank for hand_rank in SCORED_HAND_RANKS if achieved & (1 << hand_rank.value)] # worst first
+
+        # one 13 bit rank word per suit, bit n of pairs, trips and quads is set when rank index n is held in at least
+        # 2, 3 or 4 suits
+        suit_words = tuple((board & mask) >> (13 * idx) for idx, mask in enumerate(SUIT_MASKS))
+        s0, s1, s2, s3 = suit_words
+        pairs = (s0 & s1) | (s0 & s2) | (s0 & s3) | (s1 & s2) | (s1 & s3) | (s2 & s3)
+        trips = (s0 & s1 & (s2 | s3)) | ((s0 | s1) & s2 & s3)
+        quads = s0 & s1 & s2 & s3
+        self.hand_rank = best = ranks[-1]
+
+        def cards_of_rank(rank_index: int) -> list:
+            """ the cards of one rank, in sorted order """
+            return [card for card in tmp if card.rank.value - 2 == rank_index]
+
+        # the high card for the hand, the first of four of a kind, the last of three of a kind or the first of the
+        # highest pair, otherwise the highest card
+        if quads:
+            self.significant_high_card = cards_of_rank(quads.bit_length() - 1)[0]
+        elif trips:
+            self.significant_high_card = cards_of_rank(trips.bit_length() - 1)[2]
+        elif pairs:
+            self.significant_high_card = cards_of_rank(pairs.bit_length() - 1)[0]
+        else:
+            self.significant_high_card = tmp[-1]
+
+        if achieved & _STRAIGHT_BIT:
+            top = STRAIGHT_TABLE[s0 | s1 | s2 | s3] # the rank index of the top card of the highest straight
+            # rank index -1 is the low ace of the wheel, r % 13 maps it to 12
+            self.straight_cards = [next(card for card in tmp if card.rank.value - 2 == r % 13) for r in range(top - 4, top + 1)]
+
+        if best == HandRank.STRAIGHT_FLUSH:
+            for idx, suit in enumerate(Suit):
+                top = STRAIGHT_TABLE[suit_words[idx]]
+                if top >= 0:
+                    self.straight_cards = [next(card for card in tmp if card.suit == suit and card.rank.value - 2 == r % 13)
+                                           for r in range(top - 4, top + 1)]
                     break
-            else:
-                self.hand_rank = HandRank.STRAIGHT_FLUSH
-                ranks.append(HandRank.STRAIGHT_FLUSH)
-                self.winning_cards = self.straight_cards
+            self.winning_cards = self.straight_cards
+        elif best == HandRank.FOUR_OF_A_KIND:
+            self.winning_cards = cards_of_rank(quads.bit_length() - 1)
+        elif best == HandRank.FULL_HOUSE:
+            trip_rank = trips.bit_length() - 1
+            other_pairs = pairs & ~(1 << trip_rank)
+            self.winning_cards = cards_of_rank(trip_rank)[:3] + cards_of_rank(other_pairs.bit_length() - 1)[:2]
+        elif best == HandRank.FLUSH:
+            suit = next(suit for idx, suit in enumerate(Suit) if suit_words[idx].bit_count() >= 5)
+            self.winning_cards = [card for card in tmp if card.suit == suit]
+        elif best == HandRank.STRAIGHT:
+            self.winning_cards = self.straight_cards
+        elif best == HandRank.THREE_OF_A_KIND:
+            self.winning_cards = cards_of_rank(trips.bit_length() - 1)[:3]
+        elif best == HandRank.TWO_PAIR:
+            pair_rank = pairs.bit_length() - 1
+            second_pairs = pairs & ~(1 << pair_rank)
+            self.winning_cards = cards_of_rank(second_pairs.bit_length() - 1)[:2] + cards_of_rank(pair_rank)[:2]
+        elif best == HandRank.PAIR:
+            self.winning_cards = cards_of_rank(pairs.bit_length() - 1)[:2]
+        else:
+            self.winning_cards = [tmp[-1]]
 
         if print_cards_and_rank is True:
             self.print_hand(self.winning_cards)
@@ -567,14 +807,13 @@ class Hand:
 
     def score_partial_hand(self, cards=None):
         """ score up to 4 cards """
-        if cards is None:
-            cards = self.cards
-
         self.hand_rank = HandRank.INITIAL
 
-        # make copy and sort the cards
-        tmp = copy(cards)
-        tmp.sort(key=lambda x: x.rank.value)
+        # the cards sorted by rank, the hand keeps its own cards sorted
+        if cards is None:
+            tmp = self._sorted
+        else:
+            tmp = sorted(cards, key=_card_rank_value)
         # self.print_hand(tmp)
 
         # check for high card
@@ -603,36 +842,19 @@ class Hand:
                 self.significant_high_card = tmp[i]
                 self.winning_cards = [tmp[i], tmp[i+1], tmp[i+2]]
 
-        # check for straight
+        # check for straight, 4 ranks in a row on the rank word, the ace also counts low
         straight = False
-        # check for duplicates
-        unique_rank = []
-        unique_cards = []
+        rank_word = 0
         for card in tmp:
-            if card.rank.value not in unique_rank:
-                unique_rank.append(card.rank.value)
-                unique_cards.append(card)
-        if len(unique_rank) != len(tmp):
-            # self.print_hand(unique_cards)
-            tmp = unique_cards
-
-        # check distance between each card
-        distances = []
-        for i in range(len(tmp) - 1):
-            distances.append(tmp[i+1].rank.value - tmp[i].rank.value)
-        # print(f"distances: {distances}")
-        pattern = [1, 1, 1]
-        rng = range(len(tmp) - 3)
-        for i in rng:
-            slice = distances[i:i+3]
-            # print(f"Slice {i}: {slice}")
-            if slice == pattern:
-                self.hand_rank = HandRank.STRAIGHT
-                straight = True
-
-                self.straight_cards = tmp[i:i+4]
-                self.winning_cards = self.straight_cards
-                break
+            rank_word |= 1 << (card.rank.value - 2)
+        word = (rank_word << 1) | ((rank_word >> 12) & 1) # bit 0 is the low ace, bit n + 1 is rank index n
+        runs = word & (word >> 1) & (word >> 2) & (word >> 3)
+        if runs:
+            self.hand_rank = HandRank.STRAIGHT
+            straight = True
+            top = runs.bit_length() + 1 # the rank index of the top card of the highest straight
+            self.straight_cards = [next(card for card in tmp if card.rank.value - 2 == r % 13) for r in range(top - 3, top + 1)]
+            self.winning_cards = self.straight_cards
 
         # check for flush
         flush = False
@@ -647,7 +869,7 @@ class Hand:
         # check for full house - cant have full house with 4 cards
 
         # check for four of a kind
-        for i in range(len(tmp)-1):
+        for i in range(len(tmp)-3):
             if tmp[i].rank == tmp[i+1].rank == tmp[i+2].rank == tmp[i+3].rank:
                 self.hand_rank = HandRank.FOUR_OF_A_KIND
                 self.significant_high_card = tmp[i]
@@ -670,14 +892,22 @@ class Hand:
     def reset_hand(self):
         """ like calling init but theoretically slightly faster, clears the hand and all other attributes """
         self.cards = []
+        self._sorted = []
+        self.mask = 0
         self.hand_rank = HandRank.INITIAL
         self.straight_cards = []
         self.winning_cards = []
         self.significant_high_card = None
 
 
+PROBABILITY_SUM_CACHE_SIZE = 1_000_000 # entries kept by PokerPlayer._get_probability_sum before the cache is cleared
+
+
 class PokerPlayer(CasinoPlayer):
     """ Class for a poker player """
+    _probability_sum_cache = {} # type: dict[tuple[int, int], float] # shared by all players, see _get_probability_sum
+    _combo_delta_cache = {} # type: dict[int, float] # delta probability sum by the bitboard of a 2 to 4 card combination
+
     def __init__(self, name: str):
         super().__init__(name)
         self.cards_in_hand = Hand()
@@ -739,23 +969,23 @@ class PokerPlayer(CasinoPlayer):
             elif bet_round_number != 0: # second, third, ---> nth round of betting
 
                 if self.current_bet >= current_table_bet:
-                    r = [True] + [False] * bet_round_number # decrease the chance of raising as the bet round number increases
-                    want_to_raise = random.choice(r[:bet_round_number+1]) # probability to raise goes down as bet round number increases
+                    # decrease the chance of raising as the bet round number increases, 1 in (bet_round_number + 1)
+                    want_to_raise = random.random() * (bet_round_number + 1) < 1
 
                     if self.probability_sum > 1 and want_to_raise is True:
                         bet = self.current_bet +1
                     else:
                         bet = 0 # bet already == to current_table_bet, so we are checking
                 else:
-                    fold = [False, False] + [True] * bet_round_number # increase the chance of folding as the bet round number increases
-                    want_to_fold = random.choice(fold[:bet_round_number+1])  # randomly decide if we want to fold or not
+                    # increase the chance of folding as the bet round number increases, (bet_round_number - 1) in (bet_round_number + 1)
+                    want_to_fold = random.random() * (bet_round_number + 1) < bet_round_number - 1
 
                     # second round of betting, might want to be more clever here but for now
                     if want_to_fold is False: # need to match bet
                         # need to determine if to raise here
                         bet = current_table_bet - self.current_bet
                     else:
-                        log.message(f'{self.name} folds')
+                        log.message('%s folds', self.name)
                         self.folded = True
                         bet = 0
 
@@ -766,39 +996,68 @@ class PokerPlayer(CasinoPlayer):
             bet = 0
 
         log.message(
-            f'BET:: {self.name} prob sum: {self.probability_sum}, new bet: {bet}, current bet : {self.current_bet}, '
-            f'current table bet: {current_table_bet}, round: {bet_round_number}, raise: {want_to_raise}, '
-            f'fold: {want_to_fold}, '
-            f' multiplier: {multiplier}, {game_state.name}, hand: {cards_in_hand},')
+            'BET:: %s prob sum: %s, new bet: %s, current bet : %s, '
+            'current table bet: %s, round: %s, raise: %s, '
+            'fold: %s, '
+            ' multiplier: %s, %s, hand: %s,',
+            self.name, self.probability_sum, bet, self.current_bet, current_table_bet, bet_round_number,
+            want_to_raise, want_to_fold, multiplier, game_state.name, cards_in_hand)
 
         self.place_bet(bet)
         return bet
 
     def _get_probability_sum(self, hand_cards: list, table_cards: list):
+        """ the summed delta probability of every 2 card hand combination with the table cards, the result only
+        depends on which cards are held so it is cached by the card bits, the same board is scored by every player
+        each round """
+        hand_bits = 0
+        for card in hand_cards:
+            hand_bits |= 1 << card.bit
+        table_bits = 0
+        for card in table_cards:
+            table_bits |= 1 << card.bit
+        key = (hand_bits, table_bits) # bitboards, two ints hash and compare faster than two frozensets
+        cache = PokerPlayer._probability_sum_cache
+        loop_prob = cache.get(key)
+        if loop_prob is None:
+            if len(cache) >= PROBABILITY_SUM_CACHE_SIZE:
+                cache.clear()
+            loop_prob = cache[key] = self._calculate_probability_sum(hand_cards, table_cards)
+        return loop_prob
+
+    def _calculate_probability_sum(self, hand_cards: list, table_cards: list):
+        """ the uncached work of _get_probability_sum """
         cnt_table_cards = len(table_cards)
-        hand_combo = list(itertools.combinations(hand_cards, 2))
+        # each hand pair and table part is kept with its bitboard, a combination is a pair and a part so its
+        # cache key is an OR and its cards are only put together when it is not cached
+        hand_pairs = [(pair, (1 << pair[0].bit) | (1 << pair[1].bit)) for pair in itertools.combinations(hand_cards, 2)]
         if cnt_table_cards == 0:
-            combination = hand_combo
+            table_parts = [((), 0)]
         elif 1 <= cnt_table_cards <= 2:
-            combination = [list(pair) + table_cards for pair in hand_combo]
+            table_parts = [(tuple(table_cards), sum(1 << card.bit for card in table_cards))]
         else: # table cards are 4 or 5, so we need to combine the hand with the table cards
-            table_combos = list(itertools.combinations(table_cards, 2))
-            c1 = []
-            for combo in table_combos:
-                lc = list(combo)
-                c1.extend([list(pair) + lc for pair in hand_combo])
-            combination = c1
-
-        loop_prob = 0  # accumulate the probability for each loop
-        for combo in combination:
-            prob = self.get_n_card_probability(combo)
-            filter = [HandRank.STRAIGHT_FLUSH, HandRank.FOUR_OF_A_KIND, HandRank.FULL_HOUSE,
-                      HandRank.FLUSH, HandRank.STRAIGHT, HandRank.THREE_OF_A_KIND,
-                      HandRank.TWO_PAIR]
-            del_prob = prob.get_delta_probability()
-            prob_sum = prob.get_delta_probability_sum()  # this sums the change, if > 0 its worth betting
-            loop_prob += prob_sum
-            # log.message(f'Check combo: {combo}, prob sum: {prob_sum}')
+            # every hand pair with every table pair, table pair major
+            table_parts = [(table_pair, (1 << table_pair[0].bit) | (1 << table_pair[1].bit))
+                           for table_pair in itertools.combinations(table_cards, 2)]
+
+        if not hand_pairs:
+            return 0
+        # every combination has the same number of cards, so the scorer is picked once for the whole batch
+        n_cards = 2 + len(table_parts[0][0])
+        scorer = self._get_n_card_scorer(n_cards)
+        if scorer is None:
+            raise Exception(f'Invalid number of cards, {n_cards}')
+        # this sums the change for each combination, if > 0 its worth betting. the same combinations come up for
+        # every player and round, there are under 300k of them so each is scored once and kept by its bitboard
+        cache = PokerPlayer._combo_delta_cache
+        loop_prob = 0
+        for table_part, table_key in table_parts:
+            for pair, pair_key in hand_pairs:
+                key = pair_key | table_key
+                delta = cache.get(key)
+                if delta is None:
+                    delta = cache[key] = scorer(*pair, *table_part).get_delta_probability_sum()
+                loop_prob += delta
         return loop_prob
 
     def _get_bet_based_on_probability_sum(self, prob_sum: float, current_bet: float, multiplier=100):
@@ -813,12 +1072,12 @@ class PokerPlayer(CasinoPlayer):
             if self.current_bet == current_bet:
                 # check
                 bet = 0
-                log.message(f'{self.name} checks')
+                log.message('%s checks', self.name)
             else:
                 # fold
                 self.folded = True
                 bet = 0
-                log.message(f'{self.name} folds')
+                log.message('%s folds', self.name)
 
         if prob_sum > 0.0:
             if self.current_bet == current_bet:
@@ -842,39 +1101,34 @@ class PokerPlayer(CasinoPlayer):
 
     def get_n_card_probability(self, cards: list):
         """ returns the probability for a 2, 3, or 4 card hand"""
-        if len(cards) == 2:
-            return self.two_card_probability(*cards)
-        if len(cards) == 3:
-            return self.three_card_probability(*cards)
-        if len(cards) == 4:
-            return self.four_card_probability(*cards)
-        raise Exception(f'Invalid number of cards, {cards}')
+        scorer = self._get_n_card_scorer(len(cards))
+        if scorer is None:
+            raise Exception(f'Invalid number of cards, {cards}')
+        return scorer(*cards)
+
+    def _get_n_card_scorer(self, n_cards: int):
+        """ the probability method for a hand of n_cards, None if there is no method for that many cards """
+        if n_cards == 2:
+            return self.two_card_probability
+        if n_cards == 3:
+            return self.three_card_probability
+        if n_cards == 4:
+            return self.four_card_probability
+        return None
 
     def two_card_probability(self, pocket_a: Card, pocket_b: Card) -> HandProbability:
         """ calculate the probability of the hand with 2 cards delt of a 52 card deck
         @ pocket_a:[Card] the first card in the hand
         @ pocket_b:[Card] the second card in the hand
          """
-        hp = HandProbability()
-        if pocket_a.rank.value == pocket_b.rank.value: # if you have a pair, there is some chance you will get other nice hands
-            hp.pair            = 1
-            hp.two_pair        = 0.269   # brute force calculated 1M hands
-            hp.three_of_a_kind = 0.119   # brute force calculated 1M hands
-            hp.full_house      = 0.00995 # 1M hands
-            hp.four_of_a_kind  = 0.0024  # 10M hands
-            hp.straight        = 0.0     # you can't have a pair and a straight
-            hp.straight_flush  = 0.0
-
-        if pocket_a.suit == pocket_b.suit:
-            hp.flush = 0.0084 # Brute force calculated 1M hands
-
-        if abs(pocket_a.rank.value - pocket_b.rank.value) == 1:
-            hp.straight = 0.01312 # 1M hands
-            hp.straight_flush = 0.0  # since you have two suites that are not equal
-            if pocket_a.suit == pocket_b.suit:
-                hp.straight_flush =  0.000197
-
-        return hp
+        code_a = pocket_a.code
+        code_b = pocket_b.code
+        pair = (code_a ^ code_b) & CODE_PRIME_MASK == 0
+        suited = code_a & code_b & CODE_SUIT_MASK != 0
+        rank_bits = (code_a | code_b) >> CODE_RANK_SHIFT
+        connected = rank_bits == (rank_bits & -rank_bits) * 0b11 # two adjacent ranks
+        # every kind of 2 card hand is precomputed, see _build_two_card_probabilities
+        return HandProbability.from_values(TWO_CARD_PROBABILITIES[(pair, suited, connected)])
 
     def three_card_probability(self, card_a: Card, card_b: Card, card_c):
         """ calculate the probability of the hand with 3 cards delt of a 52 card deck
@@ -883,9 +1137,13 @@ class PokerPlayer(CasinoPlayer):
         @ card_c:[Card] the third card in the hand
         """
         hp = HandProbability()
-        # check for pairs
-        card_value_set = set([card_a.rank.value, card_b.rank.value, card_c.rank.value])
-        if len(card_value_set) == 1:  # all cards are the same value
+        code_a = card_a.code
+        code_b = card_b.code
+        code_c = card_c.code
+        rank_bits = (code_a | code_b | code_c) >> CODE_RANK_SHIFT
+        # check for pairs, one rank bit per distinct rank
+        distinct = rank_bits.bit_count()
+        if distinct == 1:  # all cards are the same value
             hp.pair = 1
             hp.two_pair = 0.061 # Brute force calculated 1M Hands
             hp.three_of_a_kind = 1
@@ -895,25 +1153,21 @@ class PokerPlayer(CasinoPlayer):
             hp.straight_flush = 0 # cant have a straight flush if you have a pair
 
         flush = False
-        card_suite_set = set([card_a.suit.value, card_b.suit.value, card_c.suit.value])
-        if len(card_suite_set) == 1:
+        if code_a & code_b & code_c & CODE_SUIT_MASK:
             hp.flush = 0.037889 # Brute force calculated 3M hands
             flush = True
 
-        # check for straights
-        tmp = copy([card_a, card_b, card_c])
-        tmp.sort(key=lambda x: x.rank.value)
-        if abs(tmp[0] - tmp[1]) == 1 and abs(tmp[1] - tmp[2]) == 1:
+        # check for straights, the rank word is three adjacent bits, which also rules out a pair
+        if rank_bits == (rank_bits & -rank_bits) * 0b111:
             # for straights the probability is higher if the cards are in the middle of the values because
             # there are more cards that can be used to make the straight, if you have 2,3,4 the only cards
             # that can complete the straight are 5,6 but if you have 7,8,9 you can use 5,6,10,11 to complete
             # the straight.
-            vals = [card_a.rank.value, card_b.rank.value, card_c.rank.value]
-            if 2 in vals or 14 in vals:
+            if rank_bits & 0x1001: # holds a 2 or an ace
                 hp.straight = 0.013
                 if flush is True:
                     hp.straight_flush = 0.0008
-            elif 3 in vals or 13 in vals:
+            elif rank_bits & 0x0802: # holds a 3 or a king
                 hp.straight = 0.027
                 if flush is True:
                     hp.straight_flush = 0.0016
@@ -931,9 +1185,14 @@ class PokerPlayer(CasinoPlayer):
         @ card_d:[Card] the fourth card in the hand
         """
         hp = HandProbability()
-        # check for pairs
-        card_value_set = set([card_a.rank.value, card_b.rank.value, card_c.rank.value, card_d.rank.value])
-        if len(card_value_set) == 1: # all cards are the same value
+        code_a = card_a.code
+        code_b = card_b.code
+        code_c = card_c.code
+        code_d = card_d.code
+        rank_bits = (code_a | code_b | code_c | code_d) >> CODE_RANK_SHIFT
+        # check for pairs, one rank bit per distinct rank
+        distinct = rank_bits.bit_count()
+        if distinct == 1: # all cards are the same value
             hp.pair = 1
             hp.two_pair = 0
             hp.three_of_a_kind = 1
@@ -942,29 +1201,25 @@ class PokerPlayer(CasinoPlayer):
             hp.straight = 0
             hp.straight_flush = 0
             # we don't do 5 of a kind around here
-        if len(card_value_set) == 2: # two pairs
+        if distinct == 2: # two pairs
             hp.pair = 1
             hp.two_pair = 1
-        if len(card_value_set) == 3: # one pair
+        if distinct == 3: # one pair
             hp.pair = 1
 
         flush = False
-        card_suite_set = set([card_a.suit.value, card_b.suit.value, card_c.suit.value, card_d.suit.value])
-        if len(card_suite_set) == 1: # all card are the same suit
+        if code_a & code_b & code_c & code_d & CODE_SUIT_MASK: # all card are the same suit
             hp.flush = 0.18
             hp.full_house = 0
             flush = True
 
-        # check for straights
-        tmp = copy([card_a, card_b, card_c, card_d])
-        tmp.sort(key=lambda x: x.rank.value)
-        if abs(tmp[0] - tmp[1]) == 1 and abs(tmp[1] - tmp[2]) == 1 and abs(tmp[2] - tmp[3]) == 1:
+        # check for straights, the rank word is four adjacent bits, which also rules out a pair
+        if rank_bits == (rank_bits & -rank_bits) * 0b1111:
             # for straights the probability is higher if the cards are in the middle of the values because
             # there are more cards that can be used to make the straight, if you have 2,3,4 the only cards
             # that can complete the straight are 5,6 but if you have 7,8,9 you can use 5,6,10,11 to complete
             # the straight.
-            vals = [card_a.rank.value, card_b.rank.value, card_c.rank.value]
-            if 2 in vals or 14 in vals:
+            if rank_bits & 0x1001: # holds a 2 or an ace
                 hp.straight = 0.083
                 if flush is True:
                     hp.straight_flush = 0.0208
@@ -986,6 +1241,17 @@ class AiPokerPlayer(PokerPlayer):
         self.probability_to_fold = 0.03
 
 
+class _PlayerNames:
+    """ the names of some players for a log message, the list of names is only built if the message is logged """
+    __slots__ = ('players',)
+
+    def __init__(self, players: list):
+        self.players = players
+
+    def __str__(self):
+        return str([player.name for player in self.players])
+
+
 class PokerTable:
     """ Class for a poker table object """
     def __init__(self):
@@ -1012,6 +1278,8 @@ class PokerTable:
         self._winning_rank = None # type: HandRank
         self._ai_players = []
         self._game_number = 0
+        self._state_str_cache = None # type: str | None # the last get_game_state_string result
+        self._state_dirty = True # set by every method that changes the table, clears the game state string cache
 
     def next_game(self):
         """ if play has already begun at a table, calling this method will reset the table and prepare for a new game """
@@ -1023,6 +1291,7 @@ class PokerTable:
 
     def new_game(self, game_type: PokerGames, ante: int, ai_players: list, human_players: list):
         """ start a new game """
+        self._state_dirty = True
         for player in self.players: # type: PokerPlayer
             player.cards_in_hand.reset_hand()
             player.folded = False
@@ -1049,31 +1318,31 @@ class PokerTable:
 
         self.current_betting_position_reset()
 
-        log.message(f"Starting New Game: {game_type.name}")
+        log.message('Starting New Game: %s', game_type.name)
 
         # create betting order based on dealer position
         if self._first_game is True:
             self._first_game = False
             # random.shuffle(self.players)
             self.dealer_position = random.randint(0, len(self.players)-1)
-            log.message(f"First Game")
+            log.message('First Game')
         else:
             self.dealer_position = (self.dealer_position + 1) % len(self.players)
 
-        log.message(f"Dealer Position: {self.dealer_position}")
+        log.message('Dealer Position: %s', self.dealer_position)
 
         self._betting_order = self.players[self.dealer_position + 1:] + self.players[:self.dealer_position + 1]
-        log.message(f'players:       {[player.name for player in self.players]}')
-        log.message(f"Betting order: {[player.name for player in self._betting_order]}")
+        log.message('players:       %s', _PlayerNames(self.players))
+        log.message('Betting order: %s', _PlayerNames(self._betting_order))
 
         # get big and small blind bets , deal cards
         try:
             # small blind
-            log.message(f'Small Blind: {ante} to {self._betting_order[0].name}')
+            log.message('Small Blind: %s to %s', ante, self._betting_order[0].name)
             b1 = self._betting_order[0].place_bet(ante)
 
             # big blind
-            log.message(f'Big Blind: {ante*2} to {self._betting_order[1].name}')
+            log.message('Big Blind: %s to %s', ante * 2, self._betting_order[1].name)
             b2 = self._betting_order[1].place_bet(ante * 2)
             self.pot = b1 + b2
             self.current_table_bet = b2
@@ -1089,8 +1358,10 @@ class PokerTable:
         else:
             number_of_cards = 2
 
-        for player in self._betting_order:
-            player.cards_in_hand.add_cards(self.deck.deal(number_of_cards))
+        # one deal for the table, the cards go out to the players in the same order as one deal per player
+        cards = self.deck.deal(len(self._betting_order) * number_of_cards)
+        for i, player in enumerate(self._betting_order):
+            player.cards_in_hand.add_cards(cards[i * number_of_cards:(i + 1) * number_of_cards])
 
         self.game_state = GameState.PRE_FLOP_BET
 
@@ -1100,8 +1371,10 @@ class PokerTable:
 
     def progress_game(self, id: str):
         """ advance the game state """
+        self._state_dirty = True
         cbp = self._betting_order[self.current_betting_position_get()].name
-        log.message(f"Progress Game: {self.game_state.name},id: {id}, Betting Round: {self._betting_round}, Current Betting Position: {cbp}, ")
+        log.message('Progress Game: %s,id: %s, Betting Round: %s, Current Betting Position: %s, ',
+                    self.game_state.name, id, self._betting_round, cbp)
 
         table_call = self._check_table_call()
 
@@ -1109,12 +1382,12 @@ class PokerTable:
         if skip is False: # skips betting if everyone's bet matches and it's not the first betting round
             if self._human_has_bet is False:
 
-                self._bet_around_initial()
+                self._bet_around(initial=True)
                 self._human_has_bet = True
                 table_call = False
             else:
 
-                self._bet_around_final()
+                self._bet_around(initial=False)
                 self._human_has_bet = False
                 self._betting_round += 1
 
@@ -1122,29 +1395,30 @@ class PokerTable:
                 if table_call is False:
                     cbp = self._betting_order[self.current_betting_position_get()].name
                     gs = self.game_state
-                    log.message(f"Bet Round: {self._betting_round}, for: {gs}, Current Betting Position: {cbp}, bet positions: {self._betting_order}")
+                    log.message('Bet Round: %s, for: %s, Current Betting Position: %s, bet positions: %s',
+                                self._betting_round, gs, cbp, self._betting_order)
                     self.progress_game('table_call_false')
 
-        log.message(f"Check Table Call: {table_call}, Bet Round: {self._betting_round}, game state: {self.game_state}, ")
+        log.message('Check Table Call: %s, Bet Round: %s, game state: %s, ', table_call, self._betting_round, self.game_state)
         if table_call is True: # ok to move to next round
             self.reset_current_player_bets()
 
             if self.game_state == GameState.PRE_FLOP_BET:
                 self.game_state = GameState.POST_FLOP_BET
                 self.table_cards.add_cards(self.deck.deal(3))
-                log.message(f'Poker Game changed to POST_FLOP_BET, table cards: {self.table_cards}')
+                log.message('Poker Game changed to POST_FLOP_BET, table cards: %s', self.table_cards)
                 self._check_players_left_reset_round_and_progress_game('post flop')
 
             elif self.game_state == GameState.POST_FLOP_BET:
                 self.game_state = GameState.POST_TURN_BET
                 self.table_cards.add_cards(self.deck.deal(1))
-                log.message(f'Poker Game changed to POST_TURN_BET, table cards: {self.table_cards}')
+                log.message('Poker Game changed to POST_TURN_BET, table cards: %s', self.table_cards)
                 self._check_players_left_reset_round_and_progress_game('post turn')
 
             elif self.game_state == GameState.POST_TURN_BET:
                 self.game_state = GameState.POST_RIVER_BET
                 self.table_cards.add_cards(self.deck.deal(1))
-                log.message(f'Poker Game changed to POST_RIVER_BET, table cards: {self.table_cards}')
+                log.message('Poker Game changed to POST_RIVER_BET, table cards: %s', self.table_cards)
                 self._check_players_left_reset_round_and_progress_game('post river')
 
             # depending on where the human is in the betting order you will hit one of these two final cases
@@ -1160,66 +1434,45 @@ class PokerTable:
                 self._process_winner_round()
 
 
-    def _bet_around_initial(self):
-        """ iterate over players and make bets till you get to the human player """
-        log.message(f"Bet around initial: {self._betting_order[self.current_betting_position_get()].name}")
-        table_cards = self.table_cards
-        game_state = self.game_state
+    def _bet_around(self, initial: bool):
+        """ walk the betting order making the AI bets till the human player or the end of the walk
+        @param: initial: True for the walk up to the human player, it starts after the blinds in the first round and
+                at the first player otherwise and wraps around the order once. False for the walk past the human
+                player, it starts after the human and runs to the end of the order """
         bet_order = self._betting_order
-
-        self.current_betting_position_reset()
-
-        if self._bet_around_blinds is True:
-            self.current_betting_position_increment() # the first two players are the blinds
-            self.current_betting_position_increment() # [a, b, c, d, e, f]
-            cbp = self.current_betting_position_get()
-            local_betting_order = bet_order[cbp:] + bet_order[:cbp]
-            self._bet_around_blinds = False
-
+        n_players = len(bet_order)
+        if initial is True:
+            log.message('Bet around initial: %s', bet_order[self.current_betting_position_get()].name)
+            self.current_betting_position_reset()
+            if self._bet_around_blinds is True:
+                self.current_betting_position_increment() # the first two players are the blinds
+                self.current_betting_position_increment() # [a, b, c, d, e, f]
+                self._bet_around_blinds = False
+            start = self.current_betting_position_get()
+            turns = n_players
         else:
-            local_betting_order = bet_order[self.current_betting_position_get():]
-
-        for player in local_betting_order:  # type: PokerPlayer
-            if player.folded is False:
-                if player.human is False:
-                    # ai player
-                    cbp = self.current_betting_position_get()
-                    player.determine_bet(table_cards, self.current_table_bet, cbp, local_betting_order, game_state, self._betting_round)
-                    total_bet = player.current_bet
-                    if player.folded is False:
-                        if total_bet != 0 and total_bet > self.current_table_bet:
-                            self.current_table_bet = total_bet  # this is the only case that the tabel bet raises, else it stays
-                        self.pot += total_bet
-                    self.current_betting_position_increment()
-                else:
-                    # human player
-                    break
+            log.message('Bet around final: %s', bet_order[self.current_betting_position_get()].name)
+            start = self.current_betting_position_get()
+            if bet_order[start].human is True:
+                start += 1
+            turns = n_players - start
 
-    def _bet_around_final(self):
-        """ iterate over player past the human player and make bets """
-        log.message(f"Bet around final: {self._betting_order[self.current_betting_position_get()].name}")
         table_cards = self.table_cards
-        local_betting_order = self._betting_order
         game_state = self.game_state
-
-        if local_betting_order[self.current_betting_position_get()].human is True:
-            idx = self.current_betting_position_get() + 1
-        else:
-            idx = self.current_betting_position_get()
-
-        rest_of_players = local_betting_order[idx:]
-        for player in rest_of_players:  # type: PokerPlayer
+        # the index wraps so no rotated copy of the order is made
+        for turn in range(turns):
+            player = bet_order[(start + turn) % n_players]  # type: PokerPlayer
             if player.folded is False:
                 if player.human is False:
                     # ai player
                     cbp = self.current_betting_position_get()
-                    player.determine_bet(table_cards, self.current_table_bet, cbp, local_betting_order,
-                                               game_state, self._betting_round)
+                    player.determine_bet(table_cards, self.current_table_bet, cbp, bet_order, game_state, self._betting_round)
                     total_bet = player.current_bet
                     if player.folded is False:
                         if total_bet != 0 and total_bet > self.current_table_bet:
                             self.current_table_bet = total_bet  # this is the only case that the tabel bet raises, else it stays
-                        self.pot += self.current_table_bet
+                        # the walk up to the human adds the player's bet, the walk past the human adds the table bet
+                        self.pot += total_bet if initial is True else self.current_table_bet
                     self.current_betting_position_increment()
                 else:
                     # human player
@@ -1230,7 +1483,7 @@ class PokerTable:
         winner = self.get_winning_player_list(
             players_left)  # returns list like: [<player>, <HandRank>, <CardRank>, <Hand>]
         winning_player = winner[0]  # type: PokerPlayer
-        log.message(f"Game Winner! {winning_player.name}, Hand Rank: {winner[1].name}, Winning Hand: ")
+        log.message('Game Winner! %s, Hand Rank: %s, Winning Hand: ', winning_player.name, winner[1].name)
         winner[3].print_hand()
         self._winning_player = winning_player
         self._winning_rank = winner[1]
@@ -1251,21 +1504,15 @@ class PokerTable:
 
     def _check_table_call(self) -> bool:
         """ check if all players have called the current table bet, used to determine if we can move to the next betting round """
-        table_call = True
+        table_bet = self.current_table_bet
         for player in self._betting_order:  # type: PokerPlayer
-            if player.current_bet == self.current_table_bet or player.folded is True:
-                continue
-            else:
-                table_call = False
-        return table_call
+            if player.current_bet != table_bet and player.folded is False:
+                return False # one player short of the table bet is enough, no need to check the rest
+        return True
 
     def _check_for_players_still_in_the_game(self) -> list:
         """ check if there are players still in the game, returns a list of players that have not folded """
-        still_playing = []
-        for player in self._betting_order:
-            if player.folded is False:
-                still_playing.append(player)
-        return still_playing
+        return [player for player in self._betting_order if player.folded is False]
 
     def get_winning_player_list(self, players: list) -> list:
         """ check the winning hand, returns the player with the winning hand
@@ -1280,48 +1527,47 @@ class PokerTable:
 
         hand_class = Hand()
         player_hands = [] # like: [<player>, <HandRank>, <CardRank>, <Hand>]
+        # the best rank of every player in the showdown comes from one batched lookup, players are batched by the
+        # number of cards they hold, which is the same for everyone in a dealt game
+        board_codes = np.array([card.code for card in self.table_cards.cards], dtype=np.int64)
+        batches = {} # type: dict[int, list[PokerPlayer]]
+        for player in players: # type: PokerPlayer
+            if player.folded is False:
+                batches.setdefault(len(player.cards_in_hand.cards), []).append(player)
+        best_candidates = {} # type: dict[int, tuple[int, int, int]] # by player id
+        for n_cards, batch in batches.items():
+            hand_codes = np.array([[card.code for card in player.cards_in_hand.cards] for player in batch],
+                                  dtype=np.int64).reshape(len(batch), n_cards)
+            values, pair_indexes, triplet_indexes = _best_5_card_candidates_np(hand_codes, board_codes)
+            for player, value, pair_index, triplet_index in zip(batch, values.tolist(), pair_indexes.tolist(),
+                                                                 triplet_indexes.tolist()):
+                best_candidates[id(player)] = (value, pair_index, triplet_index)
+
         for player in players: # type: PokerPlayer
 
             if player.folded is False: # protect against folded players winning game
 
-                # get all the combinations of cards
-                hand_pairs = list(itertools.combinations(player.cards_in_hand.cards, 2))
-                table_triplets = list(itertools.combinations(self.table_cards.cards, 3))
-
-                # print(f"combinations for {player.name}, hand: {player.cards_in_hand.get_string_hand()}, ")
-                # for pair in hand_pairs:
-                #     print(pair)
-                #
-                # for triplet in table_triplets:
-                #     print(triplet)
-
-                # track the high values in the loop
-                running_rank = HandRank.INITIAL
-                running_high_card = Card(CardRank.TWO, Suit.DIAMONDS)
-                running_high_hand = None
+                # only the first 5 cards with the best rank are scored as a Hand to get the winning cards and the high
+                # card, the cards are picked by position so no combination of cards is built
                 running_list = [] # like: [<player>, <HandRank>, <CardRank>, <Hand>]
-
-                for hand_pair in hand_pairs:
-                    for table_triplet in table_triplets:
-
-                        cards_5 = list(hand_pair) + list(table_triplet)
-                        hand_class.reset_hand()
-                        hand_class.add_cards(cards_5)
-                        ranks = hand_class.score_5_or_7_card_hand() # this returns all ranks achieved so need to get max
-                        high_rank = max(ranks) # type: HandRank
-                        high_card = max(hand_class.winning_cards) # type: Card
-                        # print(f"EEE{high_rank}, cards: {cards_5}, {player.name},  ")
-
-                        if high_rank.value > running_rank.value:
-                            running_rank = deepcopy(high_rank)
-                            running_high_card = deepcopy(high_card)
-                            running_high_hand = deepcopy(hand_class)
-                            running_list = [player, running_rank, running_high_card, running_high_hand]
-                            log.message(f"New Winning Hand: {running_list}, player: {player.name}, ")
+                best_value, pair_index, triplet_index = best_candidates[id(player)]
+                if best_value > HandRank.INITIAL.value:
+                    hand_cards = player.cards_in_hand.cards
+                    table_cards = self.table_cards.cards
+                    cards_5 = ([hand_cards[i] for i in _combination_indexes(len(hand_cards), 2)[pair_index].tolist()] +
+                               [table_cards[i] for i in _combination_indexes(len(table_cards), 3)[triplet_index].tolist()])
+                    hand_class.reset_hand()
+                    hand_class.add_cards(cards_5)
+                    ranks = hand_class.score_5_or_7_card_hand() # this returns all ranks achieved so need to get max
+                    high_rank = max(ranks) # type: HandRank
+                    high_card = max(hand_class.winning_cards) # type: Card
+                    # the scored hand is kept, the next player is scored into a new Hand rather than a copy
+                    running_list = [player, high_rank, high_card, hand_class]
+                    hand_class = Hand()
+                    log.message('New Winning Hand: %s, player: %s, ', running_list, player.name)
 
                 if len(running_list) != 0:
                     player_hands.append(running_list)
-                hand_class.reset_hand()
 
         # there is a much more concise way to do this, but I would like to see all the hands before doing the final score
         # for hand in player_hands:
@@ -1357,8 +1603,8 @@ class PokerTable:
             # else nothing
 
         if tie_l is not None: # check if the current winning hand is higher than the tie hand
-                log.message(f"There is a tie: {winning_player_l} ")
-                log.message(f"There is a tie: {tie_l} ")
+                log.message('There is a tie: %s ', winning_player_l)
+                log.message('There is a tie: %s ', tie_l)
                 raise Exception(f"There is a tie between {winning_player_l[0].name} and {tie_l[0].name}, "
                                 f"cards: {winning_player_l[3].get_string_hand()} and {tie_l[3]}")
         else:
@@ -1366,79 +1612,47 @@ class PokerTable:
 
     def reset_current_player_bets(self):
         """ sets the current bet for all the palyers to 0, used to reset the bets after a betting round """
+        self._state_dirty = True
         for player in self.players:  # type: PokerPlayer
             player.current_bet = 0
 
     def get_game_state_string(self):
+        """ Returns an ascii representation of the game state, only rebuilt after the table state changed """
+        if self._state_dirty or self._state_str_cache is None:
+            self._state_str_cache = self._build_game_state_string()
+            self._state_dirty = False
+        return self._state_str_cache
+
+    def _player_table_string(self) -> str:
+        """ the player chart of the game state string, the header and a row per player """
+        rows = [f"|   Player    | Dealer | Folded | Chips   | Bet |\n",
+                f"-------------------------------------------------\n"]
+        for idx, player in enumerate(self.players):
+            folded = 'Yes' if player.folded else 'No '
+            dealer = 'X' if idx == self.dealer_position else ' '
+            # the widths match the header
+            rows.append(f"| {player.name:<12}|   {dealer}    |   {folded}  | {player.chips:<8}| {player.current_bet:<4}|\n")
+        return ''.join(rows)
+
+    def _build_game_state_string(self):
         """ Prints an ascii representation of the game state """
+        parts = [f"-------------Flop Cards----------\n", self.table_cards.get_string_hand(), f"\n"]
         if self._winning_player is None:
-            string = f"-------------Flop Cards----------\n"
-            string += self.table_cards.get_string_hand()
-            string += f"\n"
-
-            string += f"|   Player    | Dealer | Folded | Chips   | Bet |\n"
-            string += f"-------------------------------------------------\n"
-            for idx, player in enumerate(self.players):
-
-                folded = 'No '
-                if player.folded:
-                    folded = 'Yes'
-
-                dealer = ' '
-                if idx == self.dealer_position:
-                    dealer = 'X'
-                # add the fields to the chart, match the width of the header
-
-                l1 = 12-len(player.name)
-                st = ' ' * l1
-                l2 = 8-len(str(player.chips))
-                st2 = ' ' * l2
-                l3 = 4-len(str(player.current_bet))
-                st3 = ' ' * l3
-
-                string += f"| {player.name}{st}|   {dealer}    |   {folded}  | {player.chips}{st2}| {player.current_bet}{st3}|\n"
-
-            string += f"-------------------------------------------------\n"
-            string += f"Pot: {self.pot}     Current Bet: {self.current_table_bet}     Game State: {self.game_state.name} \n"
-            string += f"\n"
-            for player in self.human_players:  # type: PokerPlayer
-                string += f"Player: {player.name} --- chips: {player.chips} \n"
-                string += player.cards_in_hand.get_string_hand()
+            parts.append(self._player_table_string())
+            parts.append(f"-------------------------------------------------\n")
+            parts.append(f"Pot: {self.pot}     Current Bet: {self.current_table_bet}     Game State: {self.game_state.name} \n")
+            parts.append(f"\n")
         else: # create a winning player string that shows the table hand, then the winner and stats
-            string = f"-------------Flop Cards----------\n"
-            string += self.table_cards.get_string_hand()
-            string += f"\n"
-            string += f"Winner: {self._winning_player.name}, Hand Rank: {self._winning_rank.name}, Winning Hand: "
-            string += f"\n"
-            string += self._winning_hand.get_string_hand()
-            string += f"\n"
-            string += f"|   Player    | Dealer | Folded | Chips   | Bet |\n"
-            string += f"-------------------------------------------------\n"
-            for idx, player in enumerate(self.players):
-
-                folded = 'No '
-                if player.folded:
-                    folded = 'Yes'
-
-                dealer = ' '
-                if idx == self.dealer_position:
-                    dealer = 'X'
-                # add the fields to the chart, match the width of the header
-
-                l1 = 12-len(player.name)
-                st = ' ' * l1
-                l2 = 8-len(str(player.chips))
-                st2 = ' ' * l2
-                l3 = 4-len(str(player.current_bet))
-                st3 = ' ' * l3
-
-                string += f"| {player.name}{st}|   {dealer}    |   {folded}  | {player.chips}{st2}| {player.current_bet}{st3}|\n"
-
-            string += f"\n"
-            for player in self.human_players:  # type: PokerPlayer
-                string += f"Player: {player.name} --- chips: {player.chips} \n"
-                string += player.cards_in_hand.get_string_hand()
-        return string
+            parts.append(f"Winner: {self._winning_player.name}, Hand Rank: {self._winning_rank.name}, Winning Hand: ")
+            parts.append(f"\n")
+            parts.append(self._winning_hand.get_string_hand())
+            parts.append(f"\n")
+            parts.append(self._player_table_string())
+            parts.append(f"\n")
+        for player in self.human_players:  # type: PokerPlayer
+            parts.append(f"Player: {player.name} --- chips: {player.chips} \n")
+            parts.append(player.cards_in_hand.get_string_hand())
+        return ''.join(parts)
 
     def get_human_player(self) -> PokerPlayer:
         """ return the human player """
@@ -1448,6 +1662,7 @@ class PokerTable:
         """ place a bet
         @ amount: the amount to bet
         @ human_player_position: the position of the human player in the human player list, 0 for 1 human """
+        self._state_dirty = True
         try:
 
             player = self.human_players[human_player_position]  # type: PokerPlayer # in the future, maybe more than one
@@ -1469,7 +1684,7 @@ class PokerTable:
                         self.current_table_bet = player.current_bet
                     self.pot += self.current_table_bet
 
-                    log.message(f'Human Player: {player.name} placing bet: {amount} ----------------------------')
+                    log.message('Human Player: %s placing bet: %s ----------------------------', player.name, amount)
 
                 else: # need to match the table bet
                     raise Exception(f"Player {player.name} cannot bet {total_bet}, current bet is {self.current_table_bet}, "
@@ -1505,39 +1720,295 @@ class PokerTable:
 
 # brute force probability calculators ------------------------------------------
 
+# the ranks a hand can score, worst first
+SCORED_HAND_RANKS = (HandRank.HIGH_CARD, HandRank.PAIR, HandRank.TWO_PAIR, HandRank.THREE_OF_A_KIND, HandRank.STRAIGHT,
+                     HandRank.FLUSH, HandRank.FULL_HOUSE, HandRank.FOUR_OF_A_KIND, HandRank.STRAIGHT_FLUSH)
+
+# bit HandRank.value of the mask returned by _achieved_hand_ranks
+(_HIGH_CARD_BIT, _PAIR_BIT, _TWO_PAIR_BIT, _THREE_OF_A_KIND_BIT, _STRAIGHT_BIT, _FLUSH_BIT, _FULL_HOUSE_BIT,
+ _FOUR_OF_A_KIND_BIT, _STRAIGHT_FLUSH_BIT) = (1 << value for value in range(1, 10))
+
+
+def _achieved_hand_ranks(board: int) -> int:
+    """ the hand ranks achieved by the cards of a bitboard (see Hand.to_bitboard), the same ranks as the list returned
+    by Hand.score_5_or_7_card_hand but without building Card or Hand objects, used by the monte carlo kernels
+    @return: a mask where bit HandRank.value is set for each rank achieved """
+    s0 = board & 0x1FFF
+    s1 = (board >> 13) & 0x1FFF
+    s2 = (board >> 26) & 0x1FFF
+    s3 = board >> 39
+    pairs = (s0 & s1) | (s0 & s2) | (s0 & s3) | (s1 & s2) | (s1 & s3) | (s2 & s3)
+    trips = (s0 & s1 & (s2 | s3)) | ((s0 | s1) & s2 & s3)
+
+    achieved = _HIGH_CARD_BIT
+    if pairs:
+        achieved |= _PAIR_BIT
+        if pairs & (pairs - 1): # more than one rank held twice
+            achieved |= _TWO_PAIR_BIT
+        if trips:
+            achieved |= _THREE_OF_A_KIND_BIT
+            if pairs & ~(1 << (trips.bit_length() - 1)):
+                achieved |= _FULL_HOUSE_BIT
+            if s0 & s1 & s2 & s3:
+                achieved |= _FOUR_OF_A_KIND_BIT
+    if STRAIGHT_TABLE[s0 | s1 | s2 | s3] >= 0:
+        achieved |= _STRAIGHT_BIT
+    for word in (s0, s1, s2, s3):
+        if word.bit_count() >= 5:
+            achieved |= _FLUSH_BIT
+            if STRAIGHT_TABLE[word] >= 0:
+                achieved |= _STRAIGHT_FLUSH_BIT
+    return achieved
+
+
+def _build_class_achieved_masks() -> tuple:
+    """ the _achieved_hand_ranks mask of every Cactus Kev class. with 5 cards the ranks achieved only depend on the best
+    one, a full house always also holds a pair, two pairs and three of a kind, so only the first class of each rank is
+    scored with a hand made of its ranks and the other classes share its mask, a millisecond at import rather than the
+    15 or so it takes to score all 7462
+    @return: the masks indexed by class, class 0 is not used """
+    masks_by_rank_value = {}
+    for word, hand_class in FLUSH_LOOKUP.items():
+        if CLASS_RANK_VALUES[hand_class] not in masks_by_rank_value:
+            masks_by_rank_value[CLASS_RANK_VALUES[hand_class]] = _achieved_hand_ranks(word) # the ranks all in one suit
+    for product, hand_class in UNSUITED_LOOKUP.items():
+        if CLASS_RANK_VALUES[hand_class] in masks_by_rank_value:
+            continue
+        board = 0
+        suit_counts = [0] * 13 # the next suit of each rank, repeated ranks go in the next suits
+        for rank_index, prime in enumerate(RANK_PRIMES):
+            while product % prime == 0:
+                product //= prime
+                board |= 1 << (suit_counts[rank_index] * 13 + rank_index)
+                suit_counts[rank_index] += 1
+        if max(suit_counts) == 1: # five distinct ranks, move the lowest to the second suit so it is not a flush
+            low_bit = board & -board
+            board ^= low_bit | (low_bit << 13)
+        masks_by_rank_value[CLASS_RANK_VALUES[hand_class]] = _achieved_hand_ranks(board)
+    return (0,) + tuple(masks_by_rank_value[rank_value] for rank_value in CLASS_RANK_VALUES[1:])
+
+
+CLASS_ACHIEVED_MASKS = _build_class_achieved_masks()
+
+
+# 13 bit rank word tables for the vectorized kernels, int8 is enough for both
+STRAIGHT_TABLE_NP = np.array(STRAIGHT_TABLE, dtype=np.int8)
+POPCOUNT_TABLE = np.array([word.bit_count() for word in range(1 << 13)], dtype=np.int8)
+
+
+def _build_achieved_feature_table() -> np.ndarray:
+    """ the _achieved_hand_ranks mask of every combination of the features of _achieved_hand_ranks_np, bit 0 to 6 of
+    the index are a pair, two pairs, three of a kind, four of a kind, a straight, a flush and a straight flush. a full
+    house is three of a kind with a second pair
+    @return: the 128 masks indexed by the features """
+    feature_bits = (_PAIR_BIT, _TWO_PAIR_BIT, _THREE_OF_A_KIND_BIT, _FOUR_OF_A_KIND_BIT, _STRAIGHT_BIT, _FLUSH_BIT,
+                    _STRAIGHT_FLUSH_BIT)
+    table = []
+    for features in range(1 << len(feature_bits)):
+        achieved = _HIGH_CARD_BIT
+        for idx, bit in enumerate(feature_bits):
+            if features & (1 << idx):
+                achieved |= bit
+        if features & 0b110 == 0b110:
+            achieved |= _FULL_HOUSE_BIT
+        table.append(achieved)
+    return np.array(table, dtype=np.int16)
+
+
+ACHIEVED_FEATURE_TABLE = _build_achieved_feature_table()
+
+
+def _achieved_hand_ranks_np(suit_words: np.ndarray) -> np.ndarray:
+    """ vectorized version of _achieved_hand_ranks, finds the achieved ranks of many hands in one pass. each feature of
+    a hand is one bit of an index into ACHIEVED_FEATURE_TABLE so the masks come from one gather instead of a pass
+    per rank
+    @param: suit_words: a (N, 4) integer array, the 13 bit rank word of each suit of each hand, see SUIT_MASKS
+    @return: a (N,) array of masks where bit HandRank.value is set for each rank achieved """
+    s0, s1, s2, s3 = suit_words[:, 0], suit_words[:, 1], suit_words[:, 2], suit_words[:, 3]
+    # bit n of pairs, trips and quads is set when rank index n is held in at least 2, 3 or 4 suits
+    pairs = (s0 & s1) | (s0 & s2) | (s0 & s3) | (s1 & s2) | (s1 & s3) | (s2 & s3)
+    trips = (s0 & s1 & (s2 | s3)) | ((s0 | s1) & s2 & s3)
+    quads = s0 & s1 & s2 & s3
+
+    features = (pairs != 0).view(np.int8)
+    features = features | (((pairs & (pairs - 1)) != 0).view(np.int8) << 1) # more than one rank held twice
+    features |= (trips != 0).view(np.int8) << 2
+    features |= (quads != 0).view(np.int8) << 3
+    features |= (STRAIGHT_TABLE_NP[s0 | s1 | s2 | s3] >= 0).view(np.int8) << 4
+    features |= (POPCOUNT_TABLE[suit_words] >= 5).any(axis=1).view(np.int8) << 5
+    features |= (STRAIGHT_TABLE_NP[suit_words] >= 0).any(axis=1).view(np.int8) << 6 # a straight in one suit
+    return ACHIEVED_FEATURE_TABLE[features]
+
+
+def _deal_partial(rng: np.random.Generator, deck: np.ndarray, n: int, k: int) -> np.ndarray:
+    """ deal k cards without replacement from n copies of the deck with a partial Fisher-Yates shuffle, only the first
+    k positions of each copy are swapped so there is no full shuffle or sort for a deal of a few cards
+    @param: deck: (D,) the cards that can be dealt
+    @return: (n, k) the dealt cards, one deal per row """
+    decks = np.tile(deck, (n, 1))
+    rows = np.arange(n)
+    for i in range(k):
+        j = rng.integers(i, len(deck), size=n)
+        dealt = decks[rows, j]
+        decks[rows, j] = decks[:, i]
+        decks[:, i] = dealt
+    return decks[:, :k]
+
+
+def deal_and_score_many(n: int, n_cards: int = 7, seed=None, batch_size: int = 50_000) -> np.ndarray:
+    """ deal n random hands of n_cards from a full deck and classify them, the monte carlo loop around score_many. each
+    batch is dealt and classified in numpy, there is no Python work per hand
+    @param: n_cards: the cards in each hand, 5 to 7
+    @param: seed: the seed of the random generator, an int or a np.random.SeedSequence, None for a fresh one
+    @param: batch_size: hands dealt at once, bounds the memory used
+    @return: a (n,) array of the class of each hand, see score_many """
+    rng = np.random.default_rng(seed)
+    deck = np.arange(len(ALL_CARDS), dtype=np.intp) # every Card.bit
+    classes = np.empty(n, dtype=np.int16)
+    for start in range(0, n, batch_size):
+        count = min(batch_size, n - start)
+        classes[start:start + count] = score_many(_deal_partial(rng, deck, count, n_cards))
+    return classes
+
+
+def _calculate_n_card_deal_n_prob(iterations: int, cards_in_hand: list, deal_n_cards: int, rank: HandRank = HandRank.PAIR,
+                                  batch_size: int = 50_000, seed=None) -> tuple:
+    """ given the n cards passed, calculate the probability of getting a hand_rank after dealing n cards, the deals
+    are drawn and scored in batches with numpy
+    this is a module level function so the process pool pickles it by name, not a whole ProbabilityCalculator
+    @param: batch_size: deals drawn at once, bounds the memory used per process
+    @param: seed: the seed of the random generator, an int or a np.random.SeedSequence, None for a fresh one
+    @return: (hands_with_match, iterations) so the results of many processes can be pooled """
+    num_of_cards = len(cards_in_hand) + deal_n_cards
+    if num_of_cards != 5 and num_of_cards != 7:
+        msg = f"Invalid number of cards to calculate probability: {num_of_cards}, must be 5 or 7"
+        raise Exception(msg) # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+
+    # the hand as suit rank words and the deck as the bit index of every card not in the hand
+    hand_words = np.zeros(4, dtype=np.int64)
+    held = set()
+    for card in cards_in_hand:
+        hand_words[card.bit // 13] |= 1 << (card.bit % 13)
+        held.add(card.bit)
+    deck_bits = np.array([bit for bit in range(52) if bit not in held], dtype=np.int64)
+    rank_bit = 1 << rank.value
+
+    hands_with_match = 0
+    rng = np.random.default_rng(seed)
+    for start in range(0, iterations, batch_size):
+        n = min(batch_size, iterations - start)
+        # deal_n_cards without replacement for each hand, as bit indexes
+        dealt = _deal_partial(rng, deck_bits, n, deal_n_cards)
+        suit_words = np.tile(hand_words, (n, 1))
+        rows = np.arange(n)
+        for column in dealt.T:
+            suit_words[rows, column // 13] |= 1 << (column % 13)
+        # if you get a full house but are checking the probability of a pair, you need to see all ranks for the hand
+        # not just the highest rank
+        hands_with_match += int(np.count_nonzero(_achieved_hand_ranks_np(suit_words) & rank_bit))
+    return hands_with_match, iterations
+
+
+def _calculate_5_card_hand_prob(iterations: int, rank: HandRank = HandRank.PAIR, batch_size: int = 50_000,
+                                seed=None) -> tuple:
+    """ calculate the probability of a five card hand, the hands are dealt and scored in batches with numpy
+    this is a module level function so the process pool pickles it by name, not a whole ProbabilityCalculator
+    @param: batch_size: hands dealt at once, bounds the memory used per process
+    @param: seed: the seed of the random generator, an int or a np.random.SeedSequence, None for a fresh one
+    @return: (hands_with_match, iterations) so the results of many processes can be pooled """
+    hands_with_match = 0
+    rng = np.random.default_rng(seed)
+    for start in range(0, iterations, batch_size):
+        n = min(batch_size, iterations - start)
+        deals = _deal_partial(rng, CARD_CODES, n, 5)
+        hands_with_match += int(np.count_nonzero(_score_5_card_hands_np(deals) == rank.value))
+    return hands_with_match, iterations
+
+
 class ProbabilityCalculator:
     """ Class for calculating the probability of poker hands
-    Warning: Uses multiprocessing pool, may run slow in debug mode
+    the chunks run on a thread pool by default, there is nothing to fork or pickle and the lookup tables are shared.
+    the threads only run in parallel while numpy is inside a kernel that releases the GIL, the per card loop of the
+    deal is Python, so on many cores use_processes=True may be faster. a process pool may run slow in debug mode
+    the pool is started by the first calculation and kept for the next ones, close it with close() or use the
+    calculator as a context manager like: with ProbabilityCalculator() as calculator: ...
     """
-    def __init__(self):
-        self.deck = Deck()
-        self.deck.shuffle()
-        self.hand = Hand()
+    def __init__(self, seed: int = None, use_processes: bool = False):
+        """ @param: seed: makes the results repeatable, None draws fresh entropy for every calculation
+        @param: use_processes: run the chunks on a process pool instead of a thread pool """
         self.hand_probability = HandProbability()
-        self._process_count = int(os.process_cpu_count() / 2) # if you really need to crank, div by 1
+        # os.process_cpu_count is new in python 3.13
+        cpu_count = os.process_cpu_count() if hasattr(os, 'process_cpu_count') else os.cpu_count()
+        self._process_count = max(1, int(cpu_count / 2)) # if you really need to crank, div by 1
+        self._batch_size = 50_000 # hands dealt at once by the numpy kernels, bounds the memory used per process
+        self._seed = seed
+        # the work is queued as many small chunks, a worker takes the next chunk when it finishes one so a slow worker
+        # can't hold up the rest. the chunks are kept big enough for the numpy batches to pay off
+        self._chunks_per_process = 16
+        self._min_chunk_size = 10_000
+        self._use_processes = use_processes
+        self._pool = None # type: Executor # see _get_pool
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        self.close(wait=False) # don't block garbage collection or interpreter exit on the queued chunks
+
+    def close(self, wait: bool = True):
+        """ shut down the pool, a later calculation starts a new one
+        @param: wait: wait for the queued chunks to finish, if False they are cancelled """
+        pool = getattr(self, '_pool', None) # __init__ may not have got this far
+        if pool is not None:
+            self._pool = None
+            pool.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _get_pool(self) -> Executor:
+        """ the thread or process pool, started on first use """
+        if self._pool is None:
+            executor = ProcessPoolExecutor if self._use_processes else ThreadPoolExecutor
+            self._pool = executor(max_workers=self._process_count)
+        return self._pool
+
+    def _split_iterations(self, iterations: int) -> list:
+        """ split the iterations into chunks for the pool, the chunks add up to iterations """
+        iterations = int(iterations)
+        n = max(1, min(self._process_count * self._chunks_per_process, iterations // self._min_chunk_size))
+        size, extra = divmod(iterations, n)
+        return [size + 1] * extra + [size] * (n - extra)
+
+    def _pooled_probability(self, kernel, iterations: int, *args) -> float:
+        """ run a monte carlo kernel over the pool and pool the counts, a chunk that found no matches still counts its
+        iterations. the caller runs the first chunk itself while the pool works on the rest instead of waiting idle
+        @param: kernel: a module level kernel like _calculate_5_card_hand_prob
+        @param: args: the arguments of the kernel after iterations and before batch_size """
+        chunks = self._split_iterations(iterations)
+        n = len(chunks)
+        seeds = self._spawn_seeds(n)
+        pooled = []
+        if n > 1: # map queues every chunk before returning, one at a time, the results are collected below
+            pooled = self._get_pool().map(kernel, chunks[1:], *([arg] * (n - 1) for arg in args),
+                                          [self._batch_size] * (n - 1), seeds[1:], chunksize=1)
+        results = [kernel(chunks[0], *args, self._batch_size, seeds[0])]
+        results.extend(pooled)
+        log.message("Results: %s", results) # the (matches, iterations) of each chunk, only formatted when logging is on
+        matches, iterations = map(sum, zip(*results))
+        return matches / iterations
+
+    def _spawn_seeds(self, n: int) -> list:
+        """ independent random streams for n processes, a seed per process from one SeedSequence so the streams
+        never overlap """
+        return np.random.SeedSequence(self._seed).spawn(n)
 
     def _calculate_n_card_deal_n_prob(self, iterations: int, cards_in_hand: list, deal_n_cards: int, rank: HandRank = HandRank.PAIR):
         """ given the n cards passed, calculate the probability of getting a hand_rank after dealing n cards
-        this is a private method passed to a multiprocessing pool"""
-        num_of_cards = len(cards_in_hand) + deal_n_cards
-        if num_of_cards != 5 and num_of_cards != 7:
-            msg = f"Invalid number of cards to calculate probability: {num_of_cards}, must be 5 or 7"
-            raise Exception(msg) # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-
-        hands_with_match = 0
-        partial_deck = PartialDeck(cards_in_hand) # this makes a deck without the cards in hand so you dont have to remove them in each loop
-        hand = self.hand
-        for _i in range(iterations):
-            partial_deck.reset_deck()
-            partial_deck.shuffle()
-            hand.reset_hand()
-            hand.add_cards(cards_in_hand + partial_deck.deal(deal_n_cards))
-            # if you get a full house but are checking the probability of a pair, you need to see all ranks for the hand
-            # not just the highest rank
-            ranks = set(hand.score_5_or_7_card_hand())
-            if rank in ranks:
-                hands_with_match += 1
-        return hands_with_match / iterations
+        in this process, this is the work done by each worker in the pool """
+        matches, iterations = _calculate_n_card_deal_n_prob(iterations, cards_in_hand, deal_n_cards, rank,
+                                                            self._batch_size, self._seed)
+        return matches / iterations
 
     def calculate_n_card_hand_probability(self, iterations: int, cards_in_hand: list, deal_n_cards: int, hand_rank: HandRank):
         """ calculate the probability of getting a hand_rank with a given number of cards in hand and being delt n cards
@@ -1548,30 +2019,12 @@ class ProbabilityCalculator:
         @param: hand_rank: the hand rank to calculate the probability of
         @return:[float] the probability of getting the hand_rank
         """
-        with mp.Pool(self._process_count) as pool:
-            arg_list = [(int(iterations/self._process_count), cards_in_hand, deal_n_cards, hand_rank)]*self._process_count
-            results = pool.starmap(self._calculate_n_card_deal_n_prob, arg_list)
-            print(f"Results: {results}")
-            no_zeros = [x for x in results if x != 0] # for hands with low probability you can get zeros here, remove them before averaging
-            if len(no_zeros) == 0: # all processes returned zero
-                return 0 # for example if you have a pair the probability of a straight flush is zero
-            mean = sum(no_zeros) / len(no_zeros) # average the results from each process, may want to look at the variance
-            return mean
+        return self._pooled_probability(_calculate_n_card_deal_n_prob, iterations, cards_in_hand, deal_n_cards, hand_rank)
 
     def _calculate_5_card_hand_prob(self, iterations: int, rank: HandRank = HandRank.PAIR):
-        """ calculate the probability of a five card hand, this private method is passed to the multiprocessing pool """
-        hands_with_match = 0
-        deck = self.deck
-        hand = self.hand
-        for _i in range(iterations):
-            deck.reset_deck()
-            deck.shuffle()
-            hand.reset_hand()
-            hand.add_cards(deck.deal(5))
-            hand.score_5_or_7_card_hand()
-            if hand.hand_rank == rank:
-                hands_with_match += 1
-        return hands_with_match / iterations
+        """ calculate the probability of a five card hand in this process, this is the work done by each worker in the pool """
+        matches, iterations = _calculate_5_card_hand_prob(iterations, rank, self._batch_size, self._seed)
+        return matches / iterations
 
     def calculate_hand_probability(self, iterations: int = 1e6, hand_rank: HandRank = HandRank.PAIR):
         """ calculates the probability of getting a hand_rank (pair, flush, etc...) when delt five cards from a 52 card deck
@@ -1581,13 +2034,7 @@ class ProbabilityCalculator:
         @param: hand_rank: the hand rank to calculate the probability of
         @return: [float] the probability of getting the hand_rank if delt 5 cards from a 52 card deck
         """
-        with mp.Pool(self._process_count) as pool:
-            arg_list = [(int(iterations/self._process_count), hand_rank)]*self._process_count # divides the work for each process
-            results = pool.starmap(self._calculate_5_card_hand_prob, arg_list) # maps the result of each process to a list
-            print(f"Results: {results}")  # interesting to see the results of each process
-            no_zeros = [x for x in results if x != 0] # for hands with low probability you can get zeros here, remove them before averaging
-            mean = sum(no_zeros) / len(no_zeros) # average the results from each process, may want to look at the variance
-            return mean
+        return self._pooled_probability(_calculate_5_card_hand_prob, iterations, hand_rank)
 
 
 
@@ -1,13 +1,71 @@
 import ast
 import random
+import re
+import numpy as np
 from player import CasinoPlayer
 
+WIN_MASK = np.eye(38, dtype=np.uint8) # row n is a straight bet on wheel index n, 38 columns covers the American '00'
+BET_POSITIONS_RE = re.compile(r'\(([^()]*)\)|([^,()\s]+)') # a group of positions like '(2,3)' or one like '16'
+# the colors of the wheel positions shown by get_table_numbers_string, odd is red, even is black, '0' and '00' are green
+RED_POSITIONS = frozenset(str(n) for n in range(1, 37, 2))
+BLACK_POSITIONS = frozenset(str(n) for n in range(2, 37, 2))
+PAYOUT_BY_LEN = (0, 36, 17, 11, 8) # indexed by the number of positions a bet covers
+PAYOUT_MULTIPLIERS = np.array(PAYOUT_BY_LEN, dtype=np.float32)
+# the ascii betting tables shown by RouletteTable.get_table_numbers_string
+EUROPEAN_TABLE_STRING = """
+                    +------------------------------------------------------------+
+                        | 3 | 6 | 9 | 12 | 15 | 18 | 21 | 24 | 27 | 30 | 33 | 36 |
+                         --------------------------------------------------------
+                      0 | 2 | 5 | 8 | 11 | 14 | 17 | 20 | 23 | 26 | 29 | 32 | 35 |
+                         --------------------------------------------------------
+                        | 1 | 4 | 7 | 10 | 13 | 16 | 19 | 22 | 25 | 28 | 31 | 34 |
+                    +------------------------------------------------------------+
+                    """
+AMERICAN_TABLE_STRING = """
+                    +------------------------------------------------------------+
+                      0 | 3 | 6 | 9 | 12 | 15 | 18 | 21 | 24 | 27 | 30 | 33 | 36 |
+                         --------------------------------------------------------
+                    ----| 2 | 5 | 8 | 11 | 14 | 17 | 20 | 23 | 26 | 29 | 32 | 35 |
+                         --------------------------------------------------------
+                     00 | 1 | 4 | 7 | 10 | 13 | 16 | 19 | 22 | 25 | 28 | 31 | 34 |
+                    +------------------------------------------------------------+
+                """
+
 class RoulettePlayer(CasinoPlayer):
-    def __init__(self, name: str):
+    def __init__(self, name: str, n_spins: int = 0, chips: float = None):
+        """ :param n_spins: The number of spins to preallocate the bank history for
+        :param chips: The starting chips, uses the CasinoPlayer default if None """
         super().__init__(name)
+        if chips is not None:
+            self.chips = chips
         self.bet_positions = dict() # like {<bet positions>: <amount>, ...} ex: {(23): 5.0, (2,5): 12.0, (12,15,11,14): 15.0}
+        # the same bets ready for a spin, like {('2', '5'): (frozenset({2, 5}), 17 * 12.0), ...} the wheel indexes a bet
+        # covers and its payout, built once by place_bet instead of on every spin
+        self.bet_wheel_indexes = dict() # type: dict[tuple, tuple[frozenset[int], float]]
         self._running_winning_numbers = [] # type: list[str] # a list of winning positions after the wheel is spun
-        self.running_bank = []
+        self._bank = np.empty(n_spins + 1, dtype=np.float32) # preallocated bank history, index 0 is the starting bank
+        self._bank[0] = self.chips
+        self._bank_idx = 1 # write position in the bank history
+
+    @property
+    def running_bank(self) -> np.ndarray:
+        """ the bank after each spin, starting with the bank before the first spin """
+        return self._bank[:self._bank_idx]
+
+    def extend_running_bank(self, bank: np.ndarray):
+        """ adds the bank after each of many spins at once, like the result of RouletteTable.run_vectorized """
+        end = self._bank_idx + len(bank)
+        if end > self._bank.size:
+            self._grow_bank(end)
+        self._bank[self._bank_idx:end] = bank
+        self._bank_idx = end
+        if len(bank) > 0:
+            self.chips = bank[-1]
+
+    def _grow_bank(self, size: int):
+        """ grows the bank history to hold at least size entries, the capacity at least doubles so appending a spin
+        at a time is amortized O(1) """
+        self._bank = np.resize(self._bank, max(size, 2 * self._bank.size))
 
     def place_bet(self, positions: tuple, amount: float, wheel_positions: list):
         """ positions is a list of 1, 2, or 4 positions to bet. If more than one position is given the numbers must be
@@ -28,6 +86,8 @@ class RoulettePlayer(CasinoPlayer):
             raise ValueError("Bet amount must be greater than zero.")
 
         self.bet_positions.update({tuple(positions): amount})
+        wheel_indexes = frozenset(wheel_positions.index(pos) for pos in positions)
+        self.bet_wheel_indexes[tuple(positions)] = (wheel_indexes, amount * PAYOUT_BY_LEN[len(positions)])
         self.chips -= amount
         # self.running_bank.append(self.chips)
 
@@ -35,7 +95,10 @@ class RoulettePlayer(CasinoPlayer):
         """ use to help track the running bank account """
         if money_in > 0: # note, the chips are removed in the "place_bet method"
             self.chips += money_in
-        self.running_bank.append(self.chips)
+        if self._bank_idx == self._bank.size: # more spins than were preallocated
+            self._grow_bank(self._bank_idx + 1)
+        self._bank[self._bank_idx] = self.chips
+        self._bank_idx += 1
 
     def place_dict_bet(self, bet: dict, wheel_positions: list):
         """ places a dictionary style bet
@@ -52,6 +115,13 @@ class RoulettePlayer(CasinoPlayer):
             self._running_winning_numbers.append(position)
         self.payout(amount)
 
+    def update_after_spins(self, winning_numbers: list, bank: np.ndarray):
+        """ Updates the player after many spins at once, like the result of RouletteTable.simulate_n_spins
+        :winning_numbers: The winning positions of the spins the player won.
+        :bank: The bank after each spin. """
+        self._running_winning_numbers.extend(winning_numbers)
+        self.extend_running_bank(bank)
+
     def __str__(self):
         return f"PokerPlayer: {self.name}, Chips: {self.chips}, Bets: {self.bet_positions}, Winning Numbers: {self._running_winning_numbers}"
 
@@ -64,114 +134,130 @@ class RouletteTable:
         """ Initializes the roulette table with a wheel and players
         :param european: If True, uses European roulette with a single zero. If False, uses American roulette with a double zero. """
 
-        self._wheel_positions = [str(n) for n in range(0, 36)] # a list of strings representing the positions on the roulette wheel
+        self._wheel_positions = [str(n) for n in range(0, 37)] # a list of strings representing the positions on the roulette wheel
         self._european_table = european # type: bool # if ture ads the '00' position for American roulette
         if european is False:
             self._wheel_positions.append('00')
+        self._wheel_index = {pos: idx for idx, pos in enumerate(self._wheel_positions)} # like {'0': 0, ..., '36': 36, '00': 37}
+        self._wheel_labels = np.array(self._wheel_positions) # used to convert vectorized spins back to positions
+        self._rng = np.random.default_rng()
 
         self._players = [] # type: [RoulettePlayer]
+        self._players_by_name = {} # type: dict[str, RoulettePlayer]
         self._winning_positions = [] # type: list[str] # a list of winning positions after the wheel is spun
 
-        self._red_black_lut = {
-            '0': 'green', '00': 'green',
-            '1': 'red', '2': 'black', '3': 'red', '4': 'black', '5': 'red',
-            '6': 'black', '7': 'red', '8': 'black', '9': 'red', '10': 'black',
-            '11': 'red', '12': 'black', '13': 'red', '14': 'black', '15': 'red',
-            '16': 'black', '17': 'red', '18': 'black',
-            '19': 'red', '20': 'black', '21': 'red', '22': 'black', '23': 'red',
-            '24': 'black', '25': 'red', '26': 'black', '27': 'red', '28': 'black',
-            '29': 'red', '30': 'black', '31': 'red', '32': 'black', '33': 'red',
-            '34': 'black', '35': 'red', '36': 'black'}
-
     def add_player(self, player: RoulettePlayer):
         """ Adds a player to the roulette table
         :param player: The player to add. """
         if not isinstance(player, RoulettePlayer):
             raise ValueError("Player must be an instance of RoulettePlayer")
         self._players.append(player)
+        self._players_by_name[player.name] = player
 
     def spin_the_wheel(self):
         """ Simulates spinning the roulette wheel and pays out the winners """
 
         debug = False # todo: don't commit if this is True
         if debug is False:
-            winning_position = random.choice(self._wheel_positions) # type: str # like '23' or '00'
+            winning_index = random.randrange(len(self._wheel_positions)) # type: int # an index of _wheel_positions
         else:
-            winning_position = '3'
+            winning_index = self._wheel_index['3']
+        winning_position = self._wheel_positions[winning_index] # type: str # like '23' or '00'
 
         self._winning_positions.append(winning_position)
         for player in self._players: # type: RoulettePlayer
 
             payout = 0
             winner = False
-            # iterate over positions and look for a winner
-            for positions, amount in player.bet_positions.items(): # positions like: (23) or (2,5); amount like 10.0
-
-                str_pos = list((str(p) for p in positions)) # the string version of the positions, like ('23') or ('2', '5')
-
-                if winning_position in str_pos: # check if the player has a bet on the winning position
+            # iterate over the bets and look for a winner, every winning bet pays like in run_vectorized
+            for wheel_indexes, bet_payout in player.bet_wheel_indexes.values(): # like (frozenset({2, 5}), 204.0)
+                if winning_index in wheel_indexes: # check if the player has a bet on the winning position
                     winner = True
-
-                    if len(positions) == 1:
-                        payout = amount * 36
-
-                    elif len(positions) == 2:
-                        payout = amount * 17
-
-                    elif len(positions) == 3:
-                        payout = amount * 11
-
-                    elif len(positions) == 4:
-                        payout = amount * 8
+                    payout += bet_payout
 
             player.update_after_spin(winner, payout, winning_position)
         return winning_position
 
+    def _compile_bets(self, bets: dict):
+        """ converts a dictionary style bet into numpy arrays, one entry per bet, for the vectorized simulation
+        :param bets: A dictionary like {<bet positions>: <amount>, ...} example {('23',): 5.0, ('2', '5'): 12.0}
+        :return: (kinds, amounts, payouts, mask) where kinds is the number of positions covered by each bet, payouts is
+                 the amount returned when the bet wins and mask is a (bets, 38) array that is 1 where the bet wins """
+        kinds = np.empty(len(bets), dtype=np.int8)
+        amounts = np.empty(len(bets), dtype=np.float32)
+        mask = np.empty((len(bets), 38), dtype=np.uint8)
+        for idx, (positions, amount) in enumerate(bets.items()):
+            try:
+                wheel_idx = [self._wheel_index[str(pos)] for pos in positions]
+            except KeyError:
+                raise ValueError(f"Invalid bet positions: '{positions}'. Positions must be in: '{self._wheel_positions}'.")
+            kinds[idx] = len(positions)
+            amounts[idx] = amount
+            mask[idx] = WIN_MASK[wheel_idx].sum(axis=0)
+
+        payouts = amounts * PAYOUT_MULTIPLIERS[kinds]
+        return kinds, amounts, payouts, mask
+
+    def run_vectorized(self, n: int, bets: dict, bank: float) -> np.ndarray:
+        """ Simulates n spins of the wheel at once using numpy, the same bets are placed before every spin
+        :param n: The number of spins to simulate
+        :param bets: A dictionary like {<bet positions>: <amount>, ...} example {('23',): 5.0, ('2', '5'): 12.0}
+        :param bank: The bank amount before the first spin
+        :return: The bank after each spin, like the running_bank of a player """
+        kinds, amounts, payouts, mask = self._compile_bets(bets)
+
+        spins = self._draw_spins(n)
+        delta = (mask[:, spins].T @ payouts) - amounts.sum() # the win or loss for each spin, float32 is plenty for a bank
+
+        self._winning_positions.extend(self._wheel_labels[spins].tolist())
+        return bank + delta.cumsum()
+
+    def _draw_spins(self, n: int) -> np.ndarray:
+        """ draws n winning wheel indexes at once """
+        return self._rng.integers(0, len(self._wheel_positions), size=n, dtype=np.int8) # wheel positions fit in a byte
+
+    def simulate_n_spins(self, n: int) -> list:
+        """ Simulates n spins of the wheel at once for every player at the table, each player keeps the bets they
+        placed on every spin. the players are updated like n calls to spin_the_wheel with the bets placed again before
+        each spin
+        :param n: The number of spins to simulate
+        :return: The winning positions, like ['23', '0', ...] """
+        spins = self._draw_spins(n)
+        labels = self._wheel_labels[spins]
+        for player in self._players: # type: RoulettePlayer
+            if not player.bet_positions:
+                player.update_after_spins([], np.full(n, player.chips, dtype=np.float32))
+                continue # --------------------------------------------------------------------------------------------^
+            kinds, amounts, payouts, mask = self._compile_bets(player.bet_positions)
+            hits = mask[:, spins] # (bets, n) 1 where the bet wins the spin
+            delta = (hits.T @ payouts) - amounts.sum()
+            # place_bet already took the stake of the first spin out of the chips
+            bank = player.chips + amounts.sum() + delta.cumsum()
+            player.update_after_spins(labels[hits.any(axis=0)].tolist(), bank)
+
+        winning_positions = labels.tolist()
+        self._winning_positions.extend(winning_positions)
+        return winning_positions
+
     def get_table_numbers_string(self) -> str:
-        if self._european_table is True:
-            table = """
-                    +------------------------------------------------------------+
-                        | 3 | 6 | 9 | 12 | 15 | 18 | 21 | 24 | 27 | 30 | 33 | 36 |
-                         --------------------------------------------------------
-                      0 | 2 | 5 | 8 | 11 | 14 | 17 | 20 | 23 | 26 | 29 | 32 | 35 |
-                         --------------------------------------------------------
-                        | 1 | 4 | 7 | 10 | 13 | 16 | 19 | 22 | 25 | 28 | 31 | 34 |
-                    +------------------------------------------------------------+
-                    """
-        else:
-            table = """
-                    +------------------------------------------------------------+
-                      0 | 3 | 6 | 9 | 12 | 15 | 18 | 21 | 24 | 27 | 30 | 33 | 36 |
-                         --------------------------------------------------------
-                    ----| 2 | 5 | 8 | 11 | 14 | 17 | 20 | 23 | 26 | 29 | 32 | 35 |
-                         --------------------------------------------------------
-                     00 | 1 | 4 | 7 | 10 | 13 | 16 | 19 | 22 | 25 | 28 | 31 | 34 |
-                    +------------------------------------------------------------+
-                """
+        # only the winning numbers below the table change between calls
+        table = EUROPEAN_TABLE_STRING if self._european_table is True else AMERICAN_TABLE_STRING
         # creates a string like below that shows the winning positions and their color:
         """
         Red   : 3    7  22 
         Black :   4         29
         """
-        red_str =   "Red   : "
-        black_str = "Black : "
-        grn_str =   "Green : "
+        red_parts =   ["Red   : "]
+        black_parts = ["Black : "]
+        grn_parts =   ["Green : "]
 
         wins_to_show  = self._winning_positions[-25:] if len(self._winning_positions) >= 25 else self._winning_positions
         for pos in wins_to_show: # only show the last 25 winning positions
-                color = self._red_black_lut[pos]
-                if color == 'red':
-                    red_str += f" {pos:2} "
-                    black_str += f"    "
-                    grn_str += f"    "
-                elif color == 'black':
-                    red_str += f"    "
-                    black_str += f" {pos:2} "
-                    grn_str += f"    "
-                else: # green
-                    red_str += f"    "
-                    black_str += f"    "
-                    grn_str += f" {pos:2} "
+                shown = f" {pos:2} "
+                red_parts.append(shown if pos in RED_POSITIONS else "    ")
+                black_parts.append(shown if pos in BLACK_POSITIONS else "    ")
+                grn_parts.append(shown if pos not in RED_POSITIONS and pos not in BLACK_POSITIONS else "    ")
+        red_str, black_str, grn_str = ''.join(red_parts), ''.join(black_parts), ''.join(grn_parts)
 
         player = "Hit the Run Simulation button"
         if len(self._players) > 0:
@@ -186,41 +272,24 @@ class RouletteTable:
 
     def table_place_bet(self, positions: str, amounts: str, player_name='Bob'):
         """ parses positions like "1, (2,3), 16" and bets like "5, 10, 15" and places the bets for the player"""
+        bets = self.parse_bets(positions, amounts)
+        self.table_place_bet_parsed(bets, player_name=player_name)
 
-        amt_tup = ast.literal_eval(amounts)
-        positions_list = positions.split(',') # convert the string to an intermediate list like: # ['1', '(2', '3)', '16']
-
-        # loop over the list and pull out tuples
-        _open = False
-        _inner = []
-        updated_positions = []
-        for st in positions_list: # need to clean up user input to something useful
+    def parse_bets(self, positions: str, amounts: str) -> dict:
+        """ parses positions like "1, (2,3), 16" and bets like "5, 10, 15" into a dictionary style bet, parse once
+        and reuse the result with table_place_bet_parsed when the same bets are placed many times
+        :return: A dictionary like {<bet positions>: <amount>, ...} example {('1',): 5, ('2', '3'): 10, ('16',): 15} """
 
-            if '(' in st:
-                _open = True
-                _inner.append(st.replace('(', ''))
-                continue # --------------------------------------------------------------------------------------------^
-
-            if _open is True:
-                if ')' in st:
-                    _inner.append(st.replace(')', ''))
-                    updated_positions.append(tuple(_inner))
-                    _inner = []
-                    _open = False
-                else:
-                    _inner.append(st)
-                continue # --------------------------------------------------------------------------------------------^
-
-            else:
-                updated_positions.append(st)
-
-        # all the bet positions need to be iterables, so convert them if they are strings
-        formatted_positions = [(p,) if isinstance(p, str) else p for p in updated_positions]
+        amt_tup = ast.literal_eval(amounts)
+        # one pass over the user input, each match is either a group like '(2,3)' or a single position like '16'.
+        # not literal_eval, it would read the American '00' as the int 0
+        formatted_positions = [tuple(p.strip() for p in match[1].split(',')) if match[1] is not None else (match[2],)
+                               for match in BET_POSITIONS_RE.finditer(positions)]
 
         # multiple value betting, need to check a few things
         if isinstance(amt_tup, tuple):
             len_bets = len(amt_tup)
-            len_positions = len(positions_list)
+            len_positions = len(formatted_positions)
 
             if len_bets != len_positions:
                 raise ValueError(f"Number of bets {len_bets} does not match number of positions {len_positions}") # !
@@ -234,11 +303,15 @@ class RouletteTable:
             except Exception as ex:
                 raise ValueError(f"Error parsing bets: {ex}")
 
-        for player in self._players:
-            if player.name == player_name:
-                player.place_dict_bet(bets, self._wheel_positions)
-            else:
-                raise ValueError(f"Player {player_name} not found")
+        return bets
+
+    def table_place_bet_parsed(self, bets: dict, player_name='Bob'):
+        """ places a bet that was already parsed with parse_bets for the player
+        :bets: A dictionary like {<bet positions>: <amount>, ...} example {('23',): 5.0, ('2', '5'): 12.0} """
+        player = self._players_by_name.get(player_name)
+        if player is None:
+            raise ValueError(f"Player {player_name} not found")
+        player.place_dict_bet(bets, self._wheel_positions)
 
 
 
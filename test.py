@@ -1,132 +1,305 @@
+import itertools
 import unittest
-from random import shuffle
+from unittest import mock
+from collections import Counter
+
+import numpy as np
 
 import poker
 import player
 import casino
+import roulette
+
+
+def _spread_permutations(n: int) -> tuple:
+    """ the n rotations of range(n) and the n rotations of it reversed, every card is scored in every position and
+    both ways round, used instead of random.shuffle so the tests are deterministic """
+    rotations = tuple(tuple((start + idx) % n for idx in range(n)) for start in range(n))
+    return rotations + tuple(rotation[::-1] for rotation in rotations)
+
+
+# the orders each test hand is scored in, by number of cards
+PERMUTATIONS = {n: _spread_permutations(n) for n in (5, 7)}
+
+# the cards of one hand of each rank, (rank name, suit name) like MyTestCase.C takes, and the rank it scores
+HAND_RANK_CASES = (
+    ('pair', (
+        ('TWO', 'DIAMONDS'),
+        ('TWO', 'HEARTS'),
+        ('THREE', 'DIAMONDS'),
+        ('ACE', 'CLUBS'),
+        ('FIVE', 'SPADES'),
+    ), poker.HandRank.PAIR),
+    ('two_pair', (
+        ('QUEEN', 'DIAMONDS'),
+        ('QUEEN', 'HEARTS'),
+        ('THREE', 'DIAMONDS'),
+        ('THREE', 'CLUBS'),
+        ('FIVE', 'SPADES'),
+    ), poker.HandRank.TWO_PAIR),
+    ('three_of_a_kind', (
+        ('TEN', 'DIAMONDS'),
+        ('TEN', 'HEARTS'),
+        ('TEN', 'CLUBS'),
+        ('THREE', 'DIAMONDS'),
+        ('FIVE', 'SPADES'),
+    ), poker.HandRank.THREE_OF_A_KIND),
+    ('four_of_a_kind', (
+        ('TWO', 'DIAMONDS'),
+        ('TWO', 'HEARTS'),
+        ('TWO', 'CLUBS'),
+        ('TWO', 'SPADES'),
+        ('FIVE', 'SPADES'),
+    ), poker.HandRank.FOUR_OF_A_KIND),
+    ('full_house', (
+        ('TWO', 'DIAMONDS'),
+        ('TWO', 'HEARTS'),
+        ('TWO', 'CLUBS'),
+        ('THREE', 'DIAMONDS'),
+        ('THREE', 'SPADES'),
+    ), poker.HandRank.FULL_HOUSE),
+    ('straight', (
+        ('SEVEN', 'DIAMONDS'),
+        ('THREE', 'HEARTS'),
+        ('FOUR', 'CLUBS'),
+        ('FIVE', 'DIAMONDS'),
+        ('SIX', 'SPADES'),
+    ), poker.HandRank.STRAIGHT),
+    ('straight_flush', (
+        ('TEN', 'DIAMONDS'),
+        ('QUEEN', 'DIAMONDS'),
+        ('KING', 'DIAMONDS'),
+        ('JACK', 'DIAMONDS'),
+        ('ACE', 'DIAMONDS'),
+    ), poker.HandRank.STRAIGHT_FLUSH),
+    ('flush', (
+        ('TWO', 'DIAMONDS'),
+        ('THREE', 'DIAMONDS'),
+        ('FOUR', 'DIAMONDS'),
+        ('FIVE', 'DIAMONDS'),
+        ('SEVEN', 'DIAMONDS'),
+    ), poker.HandRank.FLUSH),
+)
+
+
+# CardRank.value by rank name, looked up once here rather than through the enum for every card
+RANK_VALUES = {rank.name: rank.value for rank in poker.CardRank}
+
+
+def _reference_hand_rank(keys) -> poker.HandRank:
+    """ the rank of 5 cards given as (rank name, suit name) from counting the ranks and suits, slow but independent of
+    the lookups and bitboards of the evaluators under test """
+    values = sorted(RANK_VALUES[rank] for rank, _ in keys)
+    counts = sorted(Counter(values).values(), reverse=True)
+    flush = len({suit for _, suit in keys}) == 1
+    straight = counts[0] == 1 and (values[-1] - values[0] == 4 or values == [2, 3, 4, 5, 14]) # the ace plays low
+    if straight and flush:
+        return poker.HandRank.STRAIGHT_FLUSH
+    if counts[0] == 4:
+        return poker.HandRank.FOUR_OF_A_KIND
+    if counts[:2] == [3, 2]:
+        return poker.HandRank.FULL_HOUSE
+    if flush:
+        return poker.HandRank.FLUSH
+    if straight:
+        return poker.HandRank.STRAIGHT
+    if counts[0] == 3:
+        return poker.HandRank.THREE_OF_A_KIND
+    if counts[:2] == [2, 2]:
+        return poker.HandRank.TWO_PAIR
+    if counts[0] == 2:
+        return poker.HandRank.PAIR
+    return poker.HandRank.HIGH_CARD
+
+
+# the reference rank of every test hand by its set of cards, computed once at import as an oracle for the evaluators
+GOLDEN_HAND_RANKS = {frozenset(keys): _reference_hand_rank(keys) for _, keys, _ in HAND_RANK_CASES}
 
 
 class MyTestCase(unittest.TestCase):
-    def test_hand_rank_pair(self):
-        hand = poker.Hand()
-        cards = [
-            poker.Card(poker.CardRank.TWO, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.TWO, poker.Suit.HEARTS),
-            poker.Card(poker.CardRank.THREE, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.ACE, poker.Suit.CLUBS),
-            poker.Card(poker.CardRank.FIVE, poker.Suit.SPADES),
-        ]
-        hand.add_cards(cards)
-        hand.score_5_or_7_card_hand()
-        rank = hand.hand_rank.value
+    @classmethod
+    def setUpClass(cls):
+        """ the 52 shared cards of poker.ALL_CARDS by (rank name, suit name) for every test, C('TWO', 'DIAMONDS') is
+        the two of diamonds """
+        cls.DECK = {(card.rank.name, card.suit.name): card for card in poker.ALL_CARDS}
+        cls.C = staticmethod(lambda rank, suit: cls.DECK[(rank, suit)])
 
-        self.assertEqual(rank, poker.HandRank.PAIR.value)  # add assertion here
+    def test_hand_ranks(self):
+        for (name, keys, expected), perm in itertools.product(HAND_RANK_CASES, PERMUTATIONS[5]):
+            with self.subTest(name=name, perm=perm):
+                hand = poker.Hand()
+                hand.add_cards([self.C(*keys[idx]) for idx in perm])
+                hand.score_5_or_7_card_hand()
+                golden = GOLDEN_HAND_RANKS[frozenset(keys)]
+                self.assertIs(golden, expected)
+                self.assertIs(hand.hand_rank, golden)
 
-    def test_hand_rank_two_pair(self):
-        hand = poker.Hand()
+    def test_hand_rank_wheel_straight(self):
         cards = [
-            poker.Card(poker.CardRank.QUEEN, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.QUEEN, poker.Suit.HEARTS),
-            poker.Card(poker.CardRank.THREE, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.THREE, poker.Suit.CLUBS),
-            poker.Card(poker.CardRank.FIVE, poker.Suit.SPADES),
+            self.C('ACE', 'DIAMONDS'),
+            self.C('TWO', 'HEARTS'),
+            self.C('THREE', 'DIAMONDS'),
+            self.C('FOUR', 'CLUBS'),
+            self.C('FIVE', 'SPADES'),
         ]
-        shuffle(cards)
-        hand.add_cards(cards)
-        hand.score_5_or_7_card_hand()
-        rank = hand.hand_rank.value
-        self.assertEqual(rank, poker.HandRank.TWO_PAIR.value)
+        for perm in PERMUTATIONS[5]:
+            with self.subTest(perm=perm):
+                hand = poker.Hand()
+                hand.add_cards([cards[idx] for idx in perm])
+                hand.score_5_or_7_card_hand()
+                self.assertIs(hand.hand_rank, poker.HandRank.STRAIGHT)
+                self.assertEqual(hand.straight_cards[0].rank, poker.CardRank.ACE) # the ace plays low
 
-    def test_hand_rank_three_of_a_kind(self):
-        hand = poker.Hand()
+    def test_hand_remove_card(self):
         cards = [
-            poker.Card(poker.CardRank.TEN, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.TEN, poker.Suit.HEARTS),
-            poker.Card(poker.CardRank.TEN, poker.Suit.CLUBS),
-            poker.Card(poker.CardRank.THREE, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.FIVE, poker.Suit.SPADES),
+            self.C('TWO', 'HEARTS'),
+            self.C('NINE', 'CLUBS'),
+            self.C('NINE', 'HEARTS'),
+            self.C('ACE', 'SPADES'),
+            self.C('FIVE', 'HEARTS'),
+            self.C('NINE', 'SPADES'),
+            self.C('KING', 'HEARTS'),
         ]
-        shuffle(cards)
-        hand.add_cards(cards)
-        hand.score_5_or_7_card_hand()
-        rank = hand.hand_rank.value
-        self.assertEqual(rank, poker.HandRank.THREE_OF_A_KIND.value)
-
-    def test_hand_rank_four_of_a_kind(self):
         hand = poker.Hand()
-        cards = [
-            poker.Card(poker.CardRank.TWO, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.TWO, poker.Suit.HEARTS),
-            poker.Card(poker.CardRank.TWO, poker.Suit.CLUBS),
-            poker.Card(poker.CardRank.TWO, poker.Suit.SPADES),
-            poker.Card(poker.CardRank.FIVE, poker.Suit.SPADES),
-        ]
-        shuffle(cards)
         hand.add_cards(cards)
-        hand.score_5_or_7_card_hand()
-        rank = hand.hand_rank.value
-        self.assertEqual(rank, poker.HandRank.FOUR_OF_A_KIND.value)
+        # one of three cards of the same rank and the highest card
+        removed = [self.C('NINE', 'HEARTS'), self.C('ACE', 'SPADES')]
+        for card in removed:
+            hand.remove_card(card)
+        remaining = poker.Hand()
+        remaining.add_cards([card for card in cards if card not in removed])
+        self.assertEqual(hand.mask, remaining.mask)
+        self.assertEqual(hand._sorted, remaining._sorted)
+        self.assertEqual(hand.score_5_or_7_card_hand(), remaining.score_5_or_7_card_hand())
 
-    def test_hand_rank_full_house(self):
-        hand = poker.Hand()
+    def test_hand_class_7_cards(self):
         cards = [
-            poker.Card(poker.CardRank.TWO, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.TWO, poker.Suit.HEARTS),
-            poker.Card(poker.CardRank.TWO, poker.Suit.CLUBS),
-            poker.Card(poker.CardRank.THREE, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.THREE, poker.Suit.SPADES),
+            self.C('ACE', 'SPADES'),
+            self.C('KING', 'SPADES'),
+            self.C('QUEEN', 'SPADES'),
+            self.C('JACK', 'SPADES'),
+            self.C('TEN', 'SPADES'),
+            self.C('ACE', 'HEARTS'),
+            self.C('ACE', 'CLUBS'),
         ]
-        shuffle(cards)
-        hand.add_cards(cards)
-        hand.score_5_or_7_card_hand()
-        rank = hand.hand_rank.value
-        self.assertEqual(rank, poker.HandRank.FULL_HOUSE.value)
+        for perm in PERMUTATIONS[7]:
+            with self.subTest(perm=perm):
+                hand = poker.Hand()
+                hand.add_cards([cards[idx] for idx in perm])
+                self.assertEqual(hand.get_hand_class(), 1) # a royal flush is the best class
 
-    def test_hand_rank_straight(self):
-        hand = poker.Hand()
-        cards = [
-            poker.Card(poker.CardRank.SEVEN, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.THREE, poker.Suit.HEARTS),
-            poker.Card(poker.CardRank.FOUR, poker.Suit.CLUBS),
-            poker.Card(poker.CardRank.FIVE, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.SIX, poker.Suit.SPADES),
-        ]
-        shuffle(cards)
-        hand.add_cards(cards)
-        hand.score_5_or_7_card_hand()
-        rank = hand.hand_rank.value
-        self.assertEqual(rank, poker.HandRank.STRAIGHT.value)
+    def test_score_many_matches_hand_class(self):
+        deck = poker.Deck()
+        deck.shuffle()
+        hands = []
+        for idx in range(0, 49, 7):
+            hand = poker.Hand()
+            hand.add_cards(deck.cards[idx:idx + 7])
+            hands.append(hand)
+        classes = poker.score_many([hand.to_bit_array() for hand in hands])
+        for hand, hand_class in zip(hands, classes):
+            self.assertEqual(hand.get_hand_class(), hand_class)
 
-    def test_hand_rank_straight_flush(self):
-        hand = poker.Hand()
-        cards = [
-            poker.Card(poker.CardRank.TEN, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.QUEEN, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.KING, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.JACK, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.ACE, poker.Suit.DIAMONDS),
-        ]
-        shuffle(cards)
-        hand.add_cards(cards)
-        hand.score_5_or_7_card_hand()
-        rank = hand.hand_rank.value
-        self.assertEqual(rank, poker.HandRank.STRAIGHT_FLUSH.value)
+    def test_deal_and_score_many(self):
+        classes = poker.deal_and_score_many(20_000, seed=7, batch_size=3_000)
+        self.assertTrue(((classes >= 1) & (classes <= 7462)).all())
+        self.assertTrue((poker.deal_and_score_many(20_000, seed=7, batch_size=3_000) == classes).all())
+        # about 43.8% of 7 card hands score a pair at best
+        pairs = (poker.CLASS_RANK_VALUE_TABLE[classes] == poker.HandRank.PAIR.value).mean()
+        self.assertAlmostEqual(pairs, 0.438, delta=0.02)
 
-    def test_hand_rank_flush(self):
-        hand = poker.Hand()
-        cards = [
-            poker.Card(poker.CardRank.TWO, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.THREE, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.FOUR, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.FIVE, poker.Suit.DIAMONDS),
-            poker.Card(poker.CardRank.SEVEN, poker.Suit.DIAMONDS),
-        ]
-        shuffle(cards)
-        hand.add_cards(cards)
-        hand.score_5_or_7_card_hand()
-        rank = hand.hand_rank.value
-        self.assertEqual(rank, poker.HandRank.FLUSH.value)
+    def test_four_card_probability_edge_straight(self):
+        # a run that holds a 2 or an ace is priced as an edge straight
+        hp = poker.PokerPlayer('edge').four_card_probability(
+            self.C('TWO', 'HEARTS'),
+            self.C('THREE', 'CLUBS'),
+            self.C('FOUR', 'DIAMONDS'),
+            self.C('FIVE', 'SPADES'),
+        )
+        self.assertEqual(hp.straight, 0.083)
+
+    def test_probability_calculator_seeded(self):
+        with poker.ProbabilityCalculator(seed=1) as calculator:
+            pair = calculator.calculate_hand_probability(200_000, poker.HandRank.PAIR)
+            self.assertEqual(calculator.calculate_hand_probability(200_000, poker.HandRank.PAIR), pair)
+        with poker.ProbabilityCalculator(seed=1, use_processes=True) as calculator:
+            self.assertEqual(calculator.calculate_hand_probability(200_000, poker.HandRank.PAIR), pair)
+        # the known chance of a pair in 5 cards, the counts of every chunk are pooled
+        self.assertAlmostEqual(pair, 0.4226, delta=0.005)
+
+    def test_winning_player_flush_beats_trips(self):
+        table = poker.PokerTable()
+        table.table_cards.add_cards([
+            self.C('TWO', 'HEARTS'),
+            self.C('SEVEN', 'HEARTS'),
+            self.C('NINE', 'HEARTS'),
+            self.C('KING', 'CLUBS'),
+            self.C('THREE', 'DIAMONDS'),
+        ])
+        flush_player = poker.PokerPlayer('flush')
+        flush_player.cards_in_hand.add_cards([
+            self.C('ACE', 'HEARTS'),
+            self.C('FOUR', 'HEARTS'),
+            self.C('QUEEN', 'SPADES'),
+            self.C('QUEEN', 'DIAMONDS'),
+        ])
+        trips_player = poker.PokerPlayer('trips')
+        trips_player.cards_in_hand.add_cards([
+            self.C('KING', 'DIAMONDS'),
+            self.C('KING', 'SPADES'),
+            self.C('EIGHT', 'CLUBS'),
+            self.C('FIVE', 'SPADES'),
+        ])
+        winner = table.get_winning_player_list([trips_player, flush_player])
+        self.assertIs(winner[0], flush_player)
+        self.assertIs(winner[1], poker.HandRank.FLUSH)
+
+    def test_roulette_run_vectorized(self):
+        table = roulette.RouletteTable()
+        # a single bet on every position always wins 36 back for 37 placed
+        bets = {(str(n),): 1.0 for n in range(37)}
+        bank = table.run_vectorized(50, bets, 100.0)
+        self.assertEqual(len(bank), 50)
+        self.assertEqual(bank[-1], 50.0)
+
+    def test_roulette_overlapping_bets_all_pay(self):
+        table = roulette.RouletteTable()
+        bob = roulette.RoulettePlayer('Bob', chips=100.0)
+        table.add_player(bob)
+        table.table_place_bet('1, (1, 2)', '5, 10', player_name='Bob')
+        # a spin of 1 wins both bets, 5 * 36 for the single and 10 * 17 for the split
+        with mock.patch.object(roulette.random, 'randrange', return_value=table._wheel_index['1']):
+            self.assertEqual(table.spin_the_wheel(), '1')
+        self.assertEqual(bob.chips, 85.0 + 180.0 + 170.0)
+
+        with mock.patch.object(table, '_draw_spins', return_value=np.array([table._wheel_index['1']], dtype=np.int8)):
+            bank = table.run_vectorized(1, bob.bet_positions, 100.0)
+        self.assertEqual(bank[-1], bob.chips)
+
+    def test_roulette_parse_bets(self):
+        table = roulette.RouletteTable(european=False)
+        bets = table.parse_bets('1, (2, 3), 00', '5, 10, 15')
+        self.assertEqual(bets, {('1',): 5, ('2', '3'): 10, ('00',): 15})
+
+    def test_roulette_place_bet_second_player(self):
+        table = roulette.RouletteTable()
+        table.add_player(roulette.RoulettePlayer('Alice'))
+        bob = roulette.RoulettePlayer('Bob')
+        table.add_player(bob)
+        table.table_place_bet('1', '5', player_name='Bob')
+        self.assertEqual(bob.bet_positions, {('1',): 5})
+        with self.assertRaises(ValueError):
+            table.table_place_bet('1', '5', player_name='Carol')
 
+    def test_roulette_simulate_n_spins(self):
+        table = roulette.RouletteTable()
+        bob = roulette.RoulettePlayer('Bob', n_spins=50, chips=100.0)
+        table.add_player(bob)
+        table.table_place_bet(','.join(str(n) for n in range(37)), '1')
+        winning_positions = table.simulate_n_spins(50)
+        self.assertEqual(len(winning_positions), 50)
+        self.assertEqual(len(bob.running_bank), 51)
+        self.assertEqual(bob.chips, 50.0)
 
 
 if __name__ == '__main__':